@@ -0,0 +1,305 @@
+"""Бенчмарк страниц заметок: задержка, число запросов к базе и память.
+
+Для каждого размера выборки создаётся пользователь с заданным числом
+заметок, после чего страницы notes:list, notes:detail, notes:add,
+notes:edit и notes:delete запрашиваются через тестовый клиент Django
+и напрямую через WSGI-приложение yanote.wsgi. Результаты пишутся в JSON
+и сравниваются с сохранённым базовым прогоном.
+
+Запуск: python -m benchmarks.endpoints --sizes 10 1000 100000
+        --output results.json --baseline benchmarks/baseline.json
+Новый базовый прогон: python -m benchmarks.endpoints
+        --output benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from itertools import count
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yanote.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from notes.cache import get_notes_cache  # noqa: E402
+from notes.models import Note  # noqa: E402
+from yanote.wsgi import application  # noqa: E402
+
+User = get_user_model()
+
+DEFAULT_SIZES = (10, 1000, 100_000)
+DEFAULT_BASELINE = Path(__file__).with_name('baseline.json')
+SEED_BATCH_SIZE = 5000
+# CSRF-проверка double submit: одинаковые cookie и заголовок проходят её.
+CSRF_TOKEN = 'b' * 32
+
+
+class ClientTransport:
+    """Запросы через django.test.Client."""
+    name = 'client'
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def request(self, method, path, data=None):
+        return getattr(self.client, method.lower())(path, data).status_code
+
+
+class WsgiTransport:
+    """Запросы напрямую к WSGI-приложению, как от реального сервера."""
+    name = 'wsgi'
+
+    def __init__(self, user):
+        client = Client()
+        client.force_login(user)
+        session_cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = (
+            f'{settings.SESSION_COOKIE_NAME}={session_cookie}; '
+            f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'
+        )
+
+    def request(self, method, path, data=None):
+        url = urlsplit(path)
+        body = urlencode(data or {}).encode()
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'HTTP_COOKIE': self.cookie,
+            'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': BytesIO(body),
+        }
+        setup_testing_defaults(environ)
+        status = []
+        result = application(
+            environ, lambda line, headers, exc_info=None: status.append(line)
+        )
+        try:
+            b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(status[0].split()[0])
+
+
+TRANSPORTS = (ClientTransport, WsgiTransport)
+
+
+def seed(size):
+    """Пользователь с size заметками; создаётся пачками через bulk_create."""
+    author = User.objects.create(username=f'bench-{size}-{time.time_ns()}')
+    for start in range(0, size, SEED_BATCH_SIZE):
+        Note.objects.bulk_create(
+            Note(
+                title=f'Заметка {number}',
+                text=f'Текст заметки номер {number}. ' * 20,
+                slug=f'{author.username}-{number}',
+                author=author,
+            )
+            for number in range(start, min(size, start + SEED_BATCH_SIZE))
+        )
+    return author
+
+
+def make_operations(author, transport, iterations):
+    """Функции, возвращающие очередной запрос (метод, путь, данные).
+
+    Пишущие операции каждый раз работают с новой заметкой, поэтому
+    каждому повтору достаётся одинаковая работа.
+    """
+    slugs = list(
+        Note.objects.filter(author=author)
+        .order_by('id').values_list('slug', flat=True)[:iterations + 1]
+    )
+    doomed = Note.objects.bulk_create(
+        Note(title='Удаляемая', text='Текст',
+             slug=f'{author.username}-{transport.name}-doomed-{number}',
+             author=author)
+        for number in range(iterations + 2)
+    )
+    doomed_slugs = iter(note.slug for note in doomed)
+    counter = count()
+
+    def cold_list():
+        get_notes_cache().clear()
+        return 'GET', reverse('notes:list'), None
+
+    def detail():
+        slug = slugs[next(counter) % len(slugs)]
+        return 'GET', reverse('notes:detail', args=(slug,)), None
+
+    def add():
+        number = next(counter)
+        return 'POST', reverse('notes:add'), {
+            'title': f'Новая {number}', 'text': 'Текст',
+            'slug': f'{author.username}-{transport.name}-new-{number}',
+        }
+
+    def edit():
+        slug = slugs[next(counter) % len(slugs)]
+        return 'POST', reverse('notes:edit', args=(slug,)), {
+            'title': 'Изменённая', 'text': f'Правка {next(counter)}',
+            'slug': slug,
+        }
+
+    def delete():
+        return 'POST', reverse('notes:delete', args=(next(doomed_slugs),)), {}
+
+    return {
+        'list': cold_list,
+        'list-cached': lambda: ('GET', reverse('notes:list'), None),
+        'detail': detail,
+        'add': add,
+        'edit': edit,
+        'delete': delete,
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(transport, operation, iterations):
+    """Время каждого запроса, затем отдельный прогон с учётом памяти.
+
+    Подсчёт запросов к базе и tracemalloc замедляют запрос, поэтому они
+    включаются только в дополнительном, не измеряемом по времени вызове.
+    """
+    transport.request(*operation())
+    samples = []
+    for _ in range(iterations):
+        method, path, data = operation()
+        started = time.perf_counter()
+        status = transport.request(method, path, data)
+        samples.append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            raise RuntimeError(f'{method} {path}: статус {status}')
+    method, path, data = operation()
+    tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        transport.request(method, path, data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(percentile(samples, 0.5), 3),
+        'p90_ms': round(percentile(samples, 0.9), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'queries': len(queries),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run(sizes, iterations):
+    results = []
+    for size in sizes:
+        author = seed(size)
+        for transport_class in TRANSPORTS:
+            transport = transport_class(author)
+            operations = make_operations(author, transport, iterations)
+            for endpoint, operation in operations.items():
+                results.append({
+                    'size': size,
+                    'endpoint': endpoint,
+                    'transport': transport.name,
+                    **measure(transport, operation, iterations),
+                })
+                print(json.dumps(results[-1], ensure_ascii=False),
+                      file=sys.stderr)
+    return results
+
+
+def result_key(result):
+    return result['size'], result['endpoint'], result['transport']
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно базового прогона.
+
+    Задержка (p50) считается регрессией, если выросла больше чем на
+    tolerance; число запросов к базе - при любом росте.
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        name = '{} {} {}'.format(*result_key(result))
+        if result['queries'] > old['queries']:
+            regressions.append(
+                f'{name}: запросов {old["queries"]} -> {result["queries"]}'
+            )
+        if result['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p50 {old["p50_ms"]} -> {result["p50_ms"]} мс'
+            )
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_SIZES)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', type=Path,
+                        help='Куда записать результаты в JSON.')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+                        help='Базовый прогон для сравнения.')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Допустимый рост p50, доля (0.5 - на 50%%).')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    old_config = connection.creation.create_test_db(
+        verbosity=0, serialize=False
+    )
+    try:
+        results = run(args.sizes, args.iterations)
+    finally:
+        connection.creation.destroy_test_db(old_config, verbosity=0)
+    report = {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'iterations': args.iterations,
+        'results': results,
+    }
+    if args.output:
+        args.output.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2) + '\n',
+            encoding='utf-8',
+        )
+    # Сравнивать прогон с самим собой бессмысленно.
+    if args.baseline.exists() and args.baseline != args.output:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            print(f'РЕГРЕССИЯ {regression}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
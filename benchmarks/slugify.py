@@ -0,0 +1,57 @@
+"""Микробенчмарк slugify: pytils против notes.slugs.
+
+Запуск: python -m benchmarks.slugify
+"""
+import random
+import timeit
+
+from pytils.translit import slugify as pytils_slugify
+
+from notes.slugs import _slugify_str, slugify
+
+NUMBER = 20_000
+CYRILLIC = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def make_titles(count, length=100, seed=0):
+    """Длинные кириллические заголовки, как в реальных заметках."""
+    rng = random.Random(seed)
+    return [
+        ' '.join(
+            ''.join(rng.choice(CYRILLIC) for _ in range(rng.randint(3, 10)))
+            for _ in range(length // 7)
+        ).capitalize()
+        for _ in range(count)
+    ]
+
+
+def bench(func, titles):
+    """Лучшее из трёх время одного вызова в микросекундах."""
+    batches = timeit.repeat(
+        lambda: [func(title) for title in titles],
+        repeat=3, number=max(1, NUMBER // len(titles)),
+    )
+    return min(batches) / (max(1, NUMBER // len(titles)) * len(titles)) * 1e6
+
+
+def main():
+    unique_titles = make_titles(NUMBER)
+    repeated_titles = make_titles(100)
+    assert all(
+        pytils_slugify(title) == slugify(title) for title in unique_titles
+    )
+    results = {
+        'pytils': bench(pytils_slugify, unique_titles),
+        'notes.slugs, без кэша': bench(
+            _slugify_str.__wrapped__, unique_titles
+        ),
+        'notes.slugs, с кэшем': bench(slugify, repeated_titles),
+    }
+    baseline = results['pytils']
+    for name, microseconds in results.items():
+        print(f'{name:<24}{microseconds:8.2f} мкс  '
+              f'x{baseline / microseconds:.1f}')
+
+
+if __name__ == '__main__':
+    main()
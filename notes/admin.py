@@ -1,5 +1,146 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import Min, Q
+from django.template.response import TemplateResponse
+from django.utils import timezone
 
-from .models import Note
+from . import metrics
+from .models import Note, NoteChange
+from .pagination import EstimatedCountPaginator
+from .services import delete_author_notes
 
-admin.site.register(Note)
+User = get_user_model()
+
+# Верхняя граница для поиска по началу заголовка диапазоном строк.
+MAX_CHAR = '\U0010ffff'
+
+
+def reassign_notes(notes, author):
+    """Передаёт заметки выборки автору несколькими запросами на всю выборку.
+
+    Прежние авторы получают в журнал изменений надгробия, новый - записи
+    об изменении, поэтому кэш списков всех затронутых авторов
+    перестаёт совпадать с их версией.
+    """
+    using = router.db_for_write(Note)
+    notes = notes.using(using).order_by()
+    changes = NoteChange.objects.using(using)
+    with transaction.atomic(using=using):
+        moved_notes = notes.exclude(author=author)
+        changes.record_queryset(moved_notes, NoteChange.DELETE)
+        moved = moved_notes.update(author=author, updated_at=timezone.now())
+        changes.record_queryset(
+            Note.objects.using(using).filter(pk__in=notes.values('pk')),
+            NoteChange.UPSERT,
+        )
+    metrics.inc('notes_note_changes_total', moved, action='update')
+    return moved
+
+
+class NoteActionForm(helpers.ActionForm):
+    author = forms.CharField(
+        label='Новый автор', required=False,
+        help_text='Логин пользователя для действия «Передать автору».',
+    )
+
+
+@admin.register(Note)
+class NoteAdmin(admin.ModelAdmin):
+    """Админка, рассчитанная на миллионы заметок.
+
+    Автор выбирается по id, а не из списка всех пользователей; поиск идёт
+    по индексам slug и title; точное число заметок не считается.
+    """
+    list_display = ('title', 'slug', 'author', 'updated_at')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
+    search_fields = ('slug', 'title')
+    search_help_text = (
+        'Точный адрес заметки или начало заголовка (с учётом регистра).'
+    )
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = NoteActionForm
+    actions = ('reassign_author', 'delete_by_author')
+
+    def save_model(self, request, obj, form, change):
+        using = router.db_for_write(Note)
+        with transaction.atomic(using=using):
+            if change and 'author' in form.changed_data:
+                # Как в reassign_notes: прежний автор получает надгробие,
+                # иначе его версия списка и кэш не заметят переноса.
+                NoteChange.objects.using(using).record_queryset(
+                    Note.objects.using(using).filter(pk=obj.pk).exclude(
+                        author_id=obj.author_id
+                    ),
+                    NoteChange.DELETE,
+                )
+            super().save_model(request, obj, form, change)
+
+    def get_actions(self, request):
+        # Общее delete_selected собирает каскад в памяти и не пишет
+        # надгробий в журнал изменений; удаление - через delete_by_author.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%...%' по каждому полю: равенство по уникальному
+        # slug и диапазон по индексу title.
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(
+            Q(slug=term) | Q(title__gte=term, title__lt=term + MAX_CHAR)
+        ), False
+
+    @admin.action(description='Передать выбранные заметки новому автору')
+    def reassign_author(self, request, queryset):
+        username = request.POST.get('author', '').strip()
+        try:
+            author = User.objects.get(username=username)
+        except User.DoesNotExist:
+            self.message_user(
+                request, f'Пользователь «{username}» не найден.',
+                messages.ERROR,
+            )
+            return
+        moved = reassign_notes(queryset, author)
+        self.message_user(
+            request, f'Передано заметок пользователю {author}: {moved}.'
+        )
+
+    @admin.action(description='Удалить все заметки авторов выбранных заметок')
+    def delete_by_author(self, request, queryset):
+        authors = User.objects.filter(pk__in=queryset.values('author_id'))
+        if request.POST.get('post'):
+            # Пачками в коротких транзакциях, чтобы не блокировать базу.
+            deleted = sum(
+                delete_author_notes(author.pk) for author in authors
+            )
+            self.message_user(request, f'Удалено заметок: {deleted}.')
+            return None
+        # Подтверждение передаёт по одной заметке каждого автора, а не
+        # все выбранные: при «выбрать все» их могут быть миллионы.
+        representatives = queryset.order_by().values('author_id').annotate(
+            note_id=Min('id')
+        ).values_list('note_id', flat=True)
+        return TemplateResponse(
+            request,
+            'admin/notes/note/delete_by_author.html',
+            {
+                **self.admin_site.each_context(request),
+                'title': 'Удаление заметок авторов',
+                'opts': self.model._meta,
+                'authors': authors,
+                'notes_count': Note.objects.filter(
+                    author__in=authors
+                ).count(),
+                'representatives': representatives,
+                'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+            },
+        )
@@ -0,0 +1,251 @@
+"""JSON API заметок для клиентов синхронизации.
+
+Авторизация - та же сессия, что и у HTML-страниц, поэтому изменяющие
+запросы должны передавать CSRF-токен в заголовке X-CSRFToken.
+"""
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.views import View
+
+from .forms import CONFLICT, WARNING, NoteForm
+from .models import NoteChange, RevisionConflict
+from .pagination import paginate_by_cursor
+from .serializers import note_to_dict
+from .views import NoteBase
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_CHANGES = 1000
+
+
+class ApiError(Exception):
+    """Ошибка запроса, которая возвращается клиенту как JSON."""
+
+    def __init__(self, errors, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(errors)
+        self.errors = errors
+        self.status = status
+
+
+def parse_int(value, name, default=None, minimum=0):
+    try:
+        number = int(default if value is None else value)
+    except (TypeError, ValueError):
+        number = None
+    if number is None or number < minimum:
+        raise ApiError({name: ['Ожидается целое число.']})
+    return number
+
+
+def parse_json(request):
+    try:
+        return json.loads(request.body)
+    except ValueError:
+        raise ApiError({'body': ['Тело запроса должно быть JSON.']})
+
+
+def ensure_object(data):
+    if not isinstance(data, dict):
+        raise ApiError({'data': ['Ожидается JSON-объект с полями заметки.']})
+    return data
+
+
+def form_errors(form):
+    return {field: list(errors) for field, errors in form.errors.items()}
+
+
+def save_note(form):
+    """Сохраняет заметку из формы; занятый slug становится ошибкой.
+
+    Правка устаревшей версии заметки возвращается со статусом 409.
+    """
+    if not form.is_valid():
+        raise ApiError(form_errors(form))
+    try:
+        return form.save()
+    except RevisionConflict:
+        raise ApiError({'__all__': [CONFLICT]}, HTTPStatus.CONFLICT)
+    except IntegrityError:
+        raise ApiError({'slug': [form.instance.slug + WARNING]})
+
+
+def create_note(author, data):
+    form = NoteForm(data=ensure_object(data))
+    form.instance.author = author
+    return save_note(form)
+
+
+def update_note(note, data, partial=False):
+    """Обновляет заметку; при partial отсутствующие поля не меняются."""
+    ensure_object(data)
+    if partial:
+        data = {
+            **{field: getattr(note, field) for field in NoteForm.Meta.fields},
+            **data,
+        }
+    return save_note(NoteForm(data=data, instance=note))
+
+
+class ApiNoteBase(NoteBase, View):
+    """Базовый класс API: область видимости и ошибки как JSON."""
+
+    def handle_no_permission(self):
+        return JsonResponse(
+            {'detail': 'Требуется авторизация.'},
+            status=HTTPStatus.UNAUTHORIZED,
+        )
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'errors': error.errors}, status=error.status)
+
+    def get_note(self, slug):
+        try:
+            return self.get_queryset().get(slug=slug)
+        except self.model.DoesNotExist:
+            raise ApiError(
+                {'slug': ['Заметка не найдена.']}, HTTPStatus.NOT_FOUND
+            )
+
+
+class NoteListApi(ApiNoteBase):
+    """Список заметок с курсорной пагинацией и создание заметки."""
+
+    def get(self, request):
+        page_size = min(
+            parse_int(request.GET.get('limit'), 'limit',
+                      default=DEFAULT_PAGE_SIZE, minimum=1),
+            MAX_PAGE_SIZE,
+        )
+        try:
+            notes, next_cursor = paginate_by_cursor(
+                self.get_queryset(), request.GET.get('after'), page_size
+            )
+        except ValueError:
+            raise ApiError({'after': ['Некорректный курсор страницы.']})
+        return JsonResponse({
+            'results': [note_to_dict(note) for note in notes],
+            'next': next_cursor,
+        })
+
+    def post(self, request):
+        note = create_note(request.user, parse_json(request))
+        return JsonResponse(note_to_dict(note), status=HTTPStatus.CREATED)
+
+
+class NoteDetailApi(ApiNoteBase):
+    """Чтение, изменение и удаление заметки."""
+
+    def get(self, request, slug):
+        return JsonResponse(note_to_dict(self.get_note(slug)))
+
+    def put(self, request, slug):
+        note = update_note(self.get_note(slug), parse_json(request))
+        return JsonResponse(note_to_dict(note))
+
+    def patch(self, request, slug):
+        note = update_note(
+            self.get_note(slug), parse_json(request), partial=True
+        )
+        return JsonResponse(note_to_dict(note))
+
+    def delete(self, request, slug):
+        self.get_note(slug).delete()
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+
+
+class NoteBatchApi(ApiNoteBase):
+    """Пакет операций create/update/delete в одной транзакции.
+
+    Тело запроса: {"operations": [{"op": "create", "data": {...}},
+    {"op": "update", "slug": "...", "data": {...}},
+    {"op": "delete", "slug": "..."}]}. Если хотя бы одна операция
+    не удалась, не применяется ни одна, а в ответе указан её номер.
+    """
+
+    def post(self, request):
+        operations = parse_json(request)
+        if isinstance(operations, dict):
+            operations = operations.get('operations')
+        if not isinstance(operations, list):
+            raise ApiError({'operations': ['Ожидается список операций.']})
+        limit = settings.NOTES_API_BATCH_LIMIT
+        if len(operations) > limit:
+            raise ApiError(
+                {'operations': [f'Не больше {limit} операций за запрос.']}
+            )
+        results = []
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                try:
+                    results.append(self.apply(operation))
+                except ApiError as error:
+                    error.errors = {'index': index, **error.errors}
+                    raise
+        return JsonResponse({'results': results})
+
+    def apply(self, operation):
+        if not isinstance(operation, dict):
+            raise ApiError({'op': ['Операция должна быть объектом.']})
+        op = operation.get('op')
+        data = operation.get('data') or {}
+        if op == 'create':
+            return note_to_dict(create_note(self.request.user, data))
+        note = self.get_note(operation.get('slug'))
+        if op == 'update':
+            return note_to_dict(update_note(note, data, partial=True))
+        if op == 'delete':
+            note.delete()
+            return {'slug': note.slug, 'deleted': True}
+        raise ApiError({'op': [f'Неизвестная операция: {op}.']})
+
+
+class NoteChangesApi(ApiNoteBase):
+    """Изменения заметок после номера ?since= для синхронизации.
+
+    Из нескольких изменений одной заметки в ответ попадает последнее:
+    для создания и правки - вместе с текущим состоянием заметки. Клиент
+    продолжает синхронизацию с last_seq, пока has_more истинно.
+    """
+
+    def get(self, request):
+        since = parse_int(request.GET.get('since'), 'since', default=0)
+        limit = min(
+            parse_int(request.GET.get('limit'), 'limit',
+                      default=MAX_CHANGES, minimum=1),
+            MAX_CHANGES,
+        )
+        changes = list(
+            NoteChange.objects.filter(author=request.user, id__gt=since)
+            .order_by('id')[:limit + 1]
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        latest = {change.note_id: change for change in changes}
+        notes = self.get_queryset().in_bulk([
+            note_id for note_id, change in latest.items()
+            if change.action == NoteChange.UPSERT
+        ])
+        results = []
+        for change in sorted(latest.values(), key=lambda item: item.id):
+            note = notes.get(change.note_id)
+            # Заметка уже удалена: её надгробие ещё впереди в журнале.
+            action = NoteChange.UPSERT if note else NoteChange.DELETE
+            results.append({
+                'seq': change.id,
+                'action': action,
+                'note_id': change.note_id,
+                'slug': change.slug,
+                'note': note_to_dict(note) if note else None,
+            })
+        return JsonResponse({
+            'changes': results,
+            'last_seq': changes[-1].id if changes else since,
+            'has_more': has_more,
+        })
@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import post_save
 
 
 class NotesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notes'
+
+    def ready(self):
+        from .middleware import user_saved
+
+        post_save.connect(
+            user_saved, sender=settings.AUTH_USER_MODEL,
+            dispatch_uid='notes.user_saved',
+        )
@@ -0,0 +1,160 @@
+"""Асинхронные варианты CBV заметок для запуска под yanote.asgi.
+
+Обработчики работают с асинхронным ORM и не занимают поток на время
+запросов к базе. Включаются настройкой NOTES_ASYNC_VIEWS.
+"""
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import IntegrityError
+from django.http import Http404, HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import reverse_lazy
+from django.utils.safestring import mark_safe
+from django.views import View
+
+from .cache import aget_list_fragment, get_notes_cache, list_fragment_key
+from .forms import (
+    CONFLICT, SAVE_CANCELLED, SAVE_PENDING, WARNING, NoteForm,
+)
+from .middleware import render_timed
+from .models import Note, RevisionConflict
+from .pagination import apaginate_by_cursor
+from .views import NotesList as SyncNotesList
+from .writer import SaveTimeout, asave_form
+
+
+class NoteBase(View):
+    """Асинхронный аналог views.NoteBase."""
+    model = Note
+    success_url = reverse_lazy('notes:success')
+    template_name = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return redirect_to_login(
+                request.get_full_path(), settings.LOGIN_URL
+            )
+        # Шаблоны и контекст-процессоры читают request.user синхронно.
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    def get_queryset(self):
+        """Пользователь может работать только со своими заметками."""
+        return self.model.objects.filter(author=self.request.user)
+
+    async def get_object(self, slug):
+        try:
+            return await self.get_queryset().aget(slug=slug)
+        except self.model.DoesNotExist:
+            raise Http404('Заметка не найдена.')
+
+    def render(self, **context):
+        return TemplateResponse(
+            self.request, self.template_name, {'view': self, **context}
+        )
+
+
+class NoteFormMixin(NoteBase):
+    template_name = 'notes/form.html'
+
+    async def save_form(self, form):
+        """Сохраняет валидную форму; занятый slug становится ошибкой."""
+        if form.is_valid():
+            try:
+                if settings.NOTES_WRITE_BEHIND:
+                    await asave_form(form)
+                else:
+                    await form.instance.asave()
+            except RevisionConflict:
+                form.add_error(None, CONFLICT)
+            except SaveTimeout as error:
+                form.add_error(
+                    None, SAVE_PENDING if error.started else SAVE_CANCELLED
+                )
+            except IntegrityError:
+                form.add_error('slug', form.instance.slug + WARNING)
+            else:
+                return HttpResponseRedirect(self.success_url)
+        return self.render(form=form)
+
+
+class NoteCreate(NoteFormMixin):
+    """Добавление заметки."""
+
+    async def get(self, request):
+        return self.render(form=NoteForm())
+
+    async def post(self, request):
+        form = NoteForm(data=request.POST)
+        form.instance.author = request.user
+        return await self.save_form(form)
+
+
+class NoteUpdate(NoteFormMixin):
+    """Редактирование заметки."""
+
+    async def get(self, request, slug):
+        note = await self.get_object(slug)
+        return self.render(form=NoteForm(instance=note), object=note,
+                           note=note)
+
+    async def post(self, request, slug):
+        note = await self.get_object(slug)
+        form = NoteForm(data=request.POST, instance=note)
+        return await self.save_form(form)
+
+
+class NoteDelete(NoteBase):
+    """Удаление заметки."""
+    template_name = 'notes/delete.html'
+
+    async def get(self, request, slug):
+        note = await self.get_object(slug)
+        return self.render(object=note, note=note)
+
+    async def post(self, request, slug):
+        note = await self.get_object(slug)
+        await note.adelete()
+        return HttpResponseRedirect(self.success_url)
+
+
+class NoteDetail(NoteBase):
+    """Заметка подробно."""
+    template_name = 'notes/detail.html'
+
+    async def get(self, request, slug):
+        note = await self.get_object(slug)
+        return self.render(object=note, note=note)
+
+
+class NotesList(NoteBase):
+    """Список всех заметок пользователя."""
+    template_name = SyncNotesList.template_name
+    fragment_template_name = SyncNotesList.fragment_template_name
+    paginate_by = SyncNotesList.paginate_by
+
+    async def get(self, request):
+        cursor = request.GET.get('after')
+        queryset = self.get_queryset().for_list()
+        cache_key = await sync_to_async(list_fragment_key)(
+            request.user.pk, cursor
+        )
+        fragment = await aget_list_fragment(cache_key)
+        if fragment is None:
+            try:
+                notes, next_cursor = await apaginate_by_cursor(
+                    queryset, cursor, self.paginate_by
+                )
+            except ValueError:
+                raise Http404('Некорректный курсор страницы.')
+            fragment = render_timed(
+                request, self.fragment_template_name,
+                {'object_list': notes, 'next_cursor': next_cursor},
+            )
+            await get_notes_cache().aset(cache_key, fragment)
+        return self.render(
+            object_list=queryset, notes_fragment=mark_safe(fragment)
+        )
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+from . import metrics
+from .models import NoteChange
+
+
+def get_notes_cache():
+    """Кэш, в котором хранятся отрендеренные списки заметок."""
+    return caches[settings.NOTES_CACHE_ALIAS]
+
+
+def get_list_version(author_id):
+    """Текущая версия списка заметок автора: id его последнего изменения.
+
+    Любая запись заметок ведёт журнал NoteChange в той же транзакции,
+    поэтому версия берётся из базы и одинакова во всех процессах, даже
+    если у каждого свой кэш. Чтение - один шаг по индексу (author, id),
+    его цена не зависит от числа заметок.
+    """
+    return NoteChange.objects.filter(author_id=author_id).order_by(
+        '-id'
+    ).values_list('id', flat=True).first() or 0
+
+
+def list_fragment_key(author_id, cursor, version=None):
+    """Ключ фрагмента страницы списка для версии заметок автора.
+
+    Фрагменты прежних версий больше не читаются и со временем
+    вытесняются из кэша.
+    """
+    if version is None:
+        version = get_list_version(author_id)
+    return make_template_fragment_key(
+        'notes_list', (author_id, version, cursor or '')
+    )
+
+
+def get_list_fragment(key):
+    """Фрагмент списка из кэша (None при промахе) с учётом в метриках."""
+    fragment = get_notes_cache().get(key)
+    _count_lookup(fragment)
+    return fragment
+
+
+async def aget_list_fragment(key):
+    fragment = await get_notes_cache().aget(key)
+    _count_lookup(fragment)
+    return fragment
+
+
+def _count_lookup(fragment):
+    metrics.inc(
+        'notes_cache_requests_total',
+        result='miss' if fragment is None else 'hit',
+    )
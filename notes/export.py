@@ -0,0 +1,63 @@
+"""Потоковая выгрузка заметок: JSON Lines или zip с Markdown-файлами.
+
+Генераторы читают заметки через iterator(chunk_size), поэтому память
+сервера не зависит от числа заметок, а первые байты уходят клиенту сразу.
+"""
+import io
+import json
+import zipfile
+
+from django.utils import timezone
+
+from .serializers import note_to_dict
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def jsonl_lines(notes, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки JSON Lines, по одной на заметку."""
+    for note in notes.iterator(chunk_size=chunk_size):
+        yield json.dumps(note_to_dict(note), ensure_ascii=False) + '\n'
+
+
+def note_to_markdown(note):
+    return f'# {note.title}\n\n{note.text}\n'
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Буфер без seek: ZipFile пишет в него, генератор забирает байты."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def markdown_zip(notes, chunk_size=EXPORT_CHUNK_SIZE):
+    """Части zip-архива с файлом <slug>.md для каждой заметки.
+
+    В поток без seek ZipFile пишет размеры файлов после их данных,
+    поэтому каждая заметка отдаётся клиенту сразу после сжатия.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for note in notes.iterator(chunk_size=chunk_size):
+            info = zipfile.ZipInfo(
+                f'{note.slug}.md',
+                date_time=timezone.localtime(note.updated_at).timetuple()[:6],
+            )
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, note_to_markdown(note))
+            yield buffer.pop()
+    # Центральный каталог архива записывается при закрытии.
+    yield buffer.pop()
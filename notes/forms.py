@@ -1,11 +1,15 @@
-from pytils.translit import slugify
-
 from django import forms
 from django.core.exceptions import ValidationError
 
 from .models import Note
 
 WARNING = ' - такой slug уже существует, придумайте уникальное значение!'
+CONFLICT = ('Заметку уже изменили в другом окне или запросе. '
+            'Обновите страницу и повторите правку.')
+SAVE_CANCELLED = ('Сохранение не дождалось своей очереди и отменено. '
+                  'Повторите попытку позже.')
+SAVE_PENDING = ('Сохранение не успело подтвердиться и может завершиться '
+                'позже. Обновите страницу, прежде чем повторять правку.')
 
 
 class NoteForm(forms.ModelForm):
@@ -15,15 +19,16 @@ class NoteForm(forms.ModelForm):
         model = Note
         fields = ('title', 'text', 'slug')
 
-    def clean_slug(self):
-        """Обрабатывает случай, если slug не уникален."""
-        cleaned_data = super().clean()
-        slug = cleaned_data.get('slug')
-        if not slug:
-            title = cleaned_data.get('title')
-            slug = slugify(title)[:100]
-        if Note.objects.filter(
-                slug=slug
-        ).exclude(id=self.instance.pk).exists():
-            raise ValidationError(slug + WARNING)
-        return slug
+    def validate_unique(self):
+        """Уникальность slug проверяется базой при сохранении заметки.
+
+        Запрос exists() перед сохранением не защищает от гонки двух
+        одновременных запросов, поэтому занятый slug обрабатывает view
+        по IntegrityError, а пустой slug заполняет Note.save().
+        """
+        exclude = self._get_validation_exclusions()
+        exclude.add('slug')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as error:
+            self._update_errors(error)
@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import services
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Удаляет все заметки пользователя пачками в коротких '
+            'транзакциях, не блокируя базу надолго.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '--batch-size', type=int, default=services.DELETE_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--delete-user', action='store_true',
+            help='После заметок удалить и самого пользователя.',
+        )
+
+    def handle(self, username, batch_size, delete_user, **options):
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+
+        def progress(deleted):
+            self.stderr.write(f'Удалено заметок: {deleted}')
+
+        if delete_user:
+            deleted = services.delete_user(user, batch_size, progress)
+        else:
+            deleted = services.delete_author_notes(
+                user.pk, batch_size, progress=progress
+            )
+        self.stderr.write(f'Готово, удалено заметок: {deleted}')
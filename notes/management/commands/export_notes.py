@@ -0,0 +1,38 @@
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes.export import EXPORT_CHUNK_SIZE, jsonl_lines
+from notes.models import Note
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выгружает заметки автора в формате JSON Lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help='Файл для записи, по умолчанию stdout.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, username, output, chunk_size, **options):
+        try:
+            author = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+        notes = Note.objects.filter(author=author).order_by('id')
+        stream = (nullcontext(self.stdout) if output == '-'
+                  else open(output, 'w', encoding='utf-8'))
+        exported = 0
+        with stream as out:
+            for line in jsonl_lines(notes, chunk_size):
+                out.write(line)
+                exported += 1
+        self.stderr.write(f'Выгружено заметок: {exported}')
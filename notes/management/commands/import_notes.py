@@ -0,0 +1,118 @@
+import json
+import sys
+from contextlib import nullcontext
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_slug
+from django.db import transaction
+
+from notes import metrics
+from notes.models import Note, NoteChange
+from notes.slugs import slugify
+
+User = get_user_model()
+
+SLUG_MAX_LENGTH = Note._meta.get_field('slug').max_length
+TITLE_MAX_LENGTH = Note._meta.get_field('title').max_length
+# Slug для заголовков без букв и цифр (например, из одних эмодзи);
+# повторы получают суффикс в allocate_slugs.
+FALLBACK_SLUG = 'note'
+
+
+def allocate_slugs(notes):
+    """Назначает заметкам пачки свободные slug.
+
+    Занятость проверяется одним запросом slug__in на всю пачку; занятые
+    и повторяющиеся внутри пачки slug получают числовой суффикс.
+    Дополнительный запрос нужен, только если такие суффиксы появились.
+    """
+    taken = set()
+    pending = [(note, note.slug, 1) for note in notes]
+    while pending:
+        taken.update(Note.objects.filter(
+            slug__in={note.slug for note, _, _ in pending}
+        ).values_list('slug', flat=True))
+        unchecked = []
+        for note, base_slug, number in pending:
+            if note.slug in taken:
+                while note.slug in taken:
+                    number += 1
+                    suffix = f'-{number}'
+                    note.slug = (
+                        base_slug[:SLUG_MAX_LENGTH - len(suffix)] + suffix
+                    )
+                unchecked.append((note, base_slug, number))
+            taken.add(note.slug)
+        # Slug с новыми суффиксами ещё не сверены с базой.
+        taken.difference_update(note.slug for note, _, _ in unchecked)
+        pending = unchecked
+
+
+class Command(BaseCommand):
+    help = ('Загружает заметки автора из файла JSON Lines с полями '
+            'title, text и необязательным slug. Занятые slug получают '
+            'числовой суффикс.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для чтения, по умолчанию stdin.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, username, path, batch_size, **options):
+        try:
+            author = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f'Пользователь {username} не найден.')
+        stream = (nullcontext(sys.stdin) if path == '-'
+                  else open(path, encoding='utf-8'))
+        imported = 0
+        with stream as lines:
+            notes = (
+                self.parse_line(line, number, author)
+                for number, line in enumerate(lines, start=1)
+                if line.strip()
+            )
+            while batch := list(islice(notes, batch_size)):
+                allocate_slugs(batch)
+                with transaction.atomic():
+                    Note.objects.bulk_create(batch)
+                    NoteChange.objects.bulk_create(
+                        NoteChange(
+                            author=author, note_id=note.pk, slug=note.slug,
+                            action=NoteChange.UPSERT,
+                        )
+                        for note in batch
+                    )
+                metrics.inc(
+                    'notes_note_changes_total', len(batch), action='create'
+                )
+                imported += len(batch)
+                self.stderr.write(f'Загружено заметок: {imported}')
+
+    def parse_line(self, line, number, author):
+        try:
+            data = json.loads(line)
+            title = data.get('title') or Note._meta.get_field(
+                'title'
+            ).get_default()
+            text = data['text']
+            if not isinstance(title, str) or not isinstance(text, str):
+                raise TypeError('title и text должны быть строками')
+            slug = (data.get('slug') or slugify(title)[:SLUG_MAX_LENGTH]
+                    or FALLBACK_SLUG)
+            validate_slug(slug)
+            return Note(
+                title=title[:TITLE_MAX_LENGTH],
+                text=text,
+                slug=slug[:SLUG_MAX_LENGTH],
+                author=author,
+            )
+        except (ValueError, KeyError, TypeError, AttributeError,
+                ValidationError) as error:
+            raise CommandError(f'Строка {number}: {error!r}')
@@ -0,0 +1,210 @@
+"""Метрики сервиса в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики в памяти и, если задан NOTES_METRICS_DIR,
+периодически сбрасывает их в свой JSON-файл в этом каталоге. Страница
+/metrics складывает файлы всех процессов, поэтому за балансировщиком
+с несколькими воркерами видны общие числа. Файлы завершившихся
+процессов остаются, чтобы счётчики не уменьшались; каталог очищают при
+выкладке.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Имя семейства: тип и описание.
+METRICS = {
+    'notes_http_requests_total': (
+        'counter', 'HTTP-запросы по маршруту, методу и статусу.'
+    ),
+    'notes_http_request_duration_seconds': (
+        'histogram', 'Время обработки запроса по маршруту.'
+    ),
+    'notes_db_queries_total': (
+        'counter', 'SQL-запросы, выполненные при обработке запросов.'
+    ),
+    'notes_cache_requests_total': (
+        'counter', 'Обращения к кэшу списков заметок: hit или miss.'
+    ),
+    'notes_cache_hit_ratio': (
+        'gauge', 'Доля попаданий в кэш списков заметок.'
+    ),
+    'notes_note_changes_total': (
+        'counter', 'Созданные, изменённые и удалённые заметки.'
+    ),
+    'notes_sqlite_file_bytes': (
+        'gauge', 'Размер файлов базы SQLite.'
+    ),
+}
+
+
+class Registry:
+    """Счётчики процесса: {(имя, метки): значение}.
+
+    Гистограмма хранится как набор счётчиков _bucket, _sum и _count,
+    поэтому значения разных процессов просто складываются.
+    """
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._file_name = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += amount
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            # Пустые корзины тоже заводятся: гистограмма всегда полная.
+            for bound in (*HISTOGRAM_BUCKETS, '+Inf'):
+                key = (f'{name}_bucket', tuple(sorted(
+                    {**labels, 'le': str(bound)}.items()
+                )))
+                self._values[key] += bound == '+Inf' or value <= bound
+            labels = tuple(sorted(labels.items()))
+            self._values[(f'{name}_sum', labels)] += value
+            self._values[(f'{name}_count', labels)] += 1
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def flush(self):
+        """Записывает счётчики процесса в его файл в NOTES_METRICS_DIR."""
+        directory = settings.NOTES_METRICS_DIR
+        if not directory:
+            return
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        data = [
+            [name, labels, value]
+            for (name, labels), value in self.samples().items()
+        ]
+        # Запись во временный файл и rename: читатель не увидит половину.
+        temporary = directory / f'.{self._file_name}.tmp'
+        temporary.write_text(json.dumps(data), encoding='utf-8')
+        os.replace(temporary, directory / self._file_name)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        elapsed = time.monotonic() - self._flushed_at
+        if elapsed >= settings.NOTES_METRICS_FLUSH_SECONDS:
+            self.flush()
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(lambda: registry.flush())
+
+
+def collect():
+    """Сумма счётчиков всех процессов (или только текущего)."""
+    directory = settings.NOTES_METRICS_DIR
+    if not directory:
+        return registry.samples()
+    registry.flush()
+    merged = defaultdict(float)
+    for path in Path(directory).glob('*.json'):
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            # Файл мог исчезнуть при очистке каталога.
+            continue
+        for name, labels, value in data:
+            merged[(name, tuple(map(tuple, labels)))] += value
+    return merged
+
+
+def sqlite_file_sizes():
+    """Размеры файлов SQLite-баз, включая журнал WAL, если он есть."""
+    sizes = {}
+    for alias, database in settings.DATABASES.items():
+        if not database['ENGINE'].endswith('sqlite3'):
+            continue
+        name = str(database['NAME'])
+        for file, path in (('main', name), ('wal', f'{name}-wal')):
+            if os.path.isfile(path):
+                sizes[(('database', alias), ('file', file))] = (
+                    os.path.getsize(path)
+                )
+    return sizes
+
+
+def gauges(samples):
+    values = {}
+    hits = samples.get(
+        ('notes_cache_requests_total', (('result', 'hit'),)), 0
+    )
+    misses = samples.get(
+        ('notes_cache_requests_total', (('result', 'miss'),)), 0
+    )
+    if hits + misses:
+        values[('notes_cache_hit_ratio', ())] = hits / (hits + misses)
+    for labels, size in sqlite_file_sizes().items():
+        values[('notes_sqlite_file_bytes', labels)] = size
+    return values
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        base = name.removesuffix(suffix)
+        if base != name and base in METRICS:
+            return base
+    return name
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def _number(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _sample_order(item):
+    (name, labels), _ = item
+    labels = dict(labels)
+    bound = labels.pop('le', None)
+    bound = float(bound) if bound is not None else 0
+    return name, sorted(labels.items()), bound
+
+
+def render():
+    """Текст страницы /metrics в формате exposition 0.0.4."""
+    samples = collect()
+    samples.update(gauges(samples))
+    families = defaultdict(list)
+    for item in sorted(samples.items(), key=_sample_order):
+        families[_family(item[0][0])].append(item)
+    lines = []
+    for family, (kind, description) in METRICS.items():
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {kind}')
+        for (name, labels), value in families.get(family, ()):
+            if labels:
+                name += '{' + ','.join(
+                    f'{key}="{_escape(label)}"' for key, label in labels
+                ) + '}'
+            lines.append(f'{name} {_number(value)}')
+    return '\n'.join(lines) + '\n'
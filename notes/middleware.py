@@ -0,0 +1,378 @@
+import cProfile
+import copy
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .querybudget import QueryCounter
+from .routers import use_primary
+
+logger = logging.getLogger('notes.performance')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+KNOWN_METHODS = (*SAFE_METHODS, 'POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class PrimaryPinningMiddleware:
+    """Read-your-writes при чтении с реплики.
+
+    Изменяющий запрос целиком работает с основной базой и ставит cookie,
+    по которой следующие NOTES_REPLICA_STICKY_SECONDS секунд чтения этого
+    пользователя тоже идут в основную базу, пока реплика догоняет.
+    Под ASGI работает асинхронно: контекстная переменная use_primary
+    переходит и в потоки sync_to_async, где выполняются запросы ORM.
+    """
+    cookie_name = 'pin_primary'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self.pin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        token = self.pin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.finish(request, response)
+
+    def pin(self, request):
+        return use_primary.set(
+            request.method not in SAFE_METHODS
+            or self.cookie_name in request.COOKIES
+        )
+
+    def finish(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.NOTES_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class UserCache:
+    """Ограниченный LRU-кэш пользователей с временем жизни записей."""
+
+    def __init__(self):
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._users.get(key)
+            if entry is None:
+                return None
+            user, user_version, expires = entry
+            if user_version != version or expires < time.monotonic():
+                del self._users[key]
+                return None
+            self._users.move_to_end(key)
+        # Каждый запрос получает свою копию: объект в кэше не меняется.
+        return copy.copy(user)
+
+    def set(self, key, user, version):
+        expires = time.monotonic() + settings.NOTES_USER_CACHE_TIMEOUT
+        with self._lock:
+            self._users[key] = (copy.copy(user), version, expires)
+            self._users.move_to_end(key)
+            while len(self._users) > settings.NOTES_USER_CACHE_SIZE:
+                self._users.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+# Поля пользователя, изменение которых должно сразу выбивать его из кэша.
+AUTH_FIELDS = {'password', 'is_active'}
+
+
+def _auth_version_key(user_id):
+    return f'notes:auth-version:{user_id}'
+
+
+def get_auth_version(user_id):
+    """Версия учётных данных пользователя в общем кэше default."""
+    key = _auth_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Начальное значение берётся от времени: если версию вытеснили
+        # из кэша, записи со старой версией с ней не совпадут.
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_auth_version(user_id):
+    key = _auth_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    """Сбрасывает кэш пользователя при смене пароля или is_active.
+
+    Версия меняется после COMMIT: иначе параллельный запрос мог бы
+    закэшировать ещё не изменённого пользователя под новой версией.
+    """
+    if update_fields is None or AUTH_FIELDS & {*update_fields}:
+        transaction.on_commit(
+            partial(bump_auth_version, instance.pk),
+            using=kwargs.get('using'),
+        )
+
+
+def _session_user_key(session):
+    return (
+        session.get(auth.SESSION_KEY),
+        session.get(auth.BACKEND_SESSION_KEY),
+        session.get(auth.HASH_SESSION_KEY),
+    )
+
+
+def get_cached_user(request):
+    """Пользователь сессии из кэша процесса или, при промахе, из базы.
+
+    Запись кэша помнит версию учётных данных пользователя (см.
+    user_saved): после смены пароля или is_active запрос идёт в базу, и
+    auth.get_user разлогинивает сессии со старым хэшем пароля. Версия
+    хранится в кэше default; если он у каждого процесса свой, другие
+    процессы увидят изменение не позже чем через
+    NOTES_USER_CACHE_TIMEOUT секунд. Прочие изменения пользователя
+    тоже видны через это время.
+    """
+    if not hasattr(request, '_cached_user'):
+        key = _session_user_key(request.session)
+        user = version = None
+        if all(key):
+            # Версия читается до базы: смена пароля во время запроса
+            # даст промах в следующий раз.
+            version = get_auth_version(key[0])
+            user = user_cache.get(key, version)
+        if user is None:
+            user = auth.get_user(request)
+            # get_user мог обновить хэш в сессии, берём ключ заново.
+            key = _session_user_key(request.session)
+            if user.is_authenticated and all(key) and version is not None:
+                user_cache.set(key, user, version)
+        request._cached_user = user
+    return request._cached_user
+
+
+async def aget_cached_user(request):
+    return await sync_to_async(get_cached_user)(request)
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware с кэшем пользователей в памяти процесса.
+
+    Убирает запрос пользователя из базы на каждом авторизованном запросе.
+    При NOTES_USER_CACHE_TIMEOUT = 0 работает как стандартный middleware.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        if settings.NOTES_USER_CACHE_TIMEOUT:
+            request.user = SimpleLazyObject(
+                lambda: get_cached_user(request)
+            )
+            request.auser = partial(aget_cached_user, request)
+
+
+def render_timed(request, template_name, context):
+    """render_to_string, время которого попадает в метрику tpl.
+
+    Нужен для шаблонов, которые view рендерит сама, например фрагмента
+    списка заметок: TemplateResponse учитывается и без него.
+    """
+    started = time.perf_counter()
+    try:
+        return render_to_string(template_name, context)
+    finally:
+        if hasattr(request, '_template_duration'):
+            request._template_duration += time.perf_counter() - started
+
+
+class ServerTimingMiddleware:
+    """Время запроса, SQL и рендеринга шаблонов в заголовке Server-Timing.
+
+    Те же цифры пишутся строкой key=value в лог notes.performance.
+    Доля NOTES_PROFILE_SAMPLE_RATE запросов выполняется под cProfile;
+    профиль сохраняется в NOTES_PROFILE_DIR, если запрос шёл дольше
+    NOTES_PROFILE_SLOW_MS миллисекунд. Под ASGI профиль снимается в
+    потоке цикла событий и может захватить соседние запросы.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profiler = self.sample_profiler()
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        with QueryCounter() as queries:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        self.finish(request, response, started, queries, profiler)
+        return response
+
+    async def __acall__(self, request):
+        profiler = self.sample_profiler()
+        request._template_duration = 0.0
+        started = time.perf_counter()
+        async with QueryCounter() as queries:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        self.finish(request, response, started, queries, profiler)
+        return response
+
+    @staticmethod
+    def sample_profiler():
+        if random.random() < settings.NOTES_PROFILE_SAMPLE_RATE:
+            return cProfile.Profile()
+        return None
+
+    def finish(self, request, response, started, queries, profiler):
+        total_ms = (time.perf_counter() - started) * 1000
+        timing = {
+            'db': (queries.duration * 1000, f'{len(queries)} queries'),
+            'tpl': (request._template_duration * 1000, 'template'),
+            'total': (total_ms, 'view'),
+        }
+        response.headers['Server-Timing'] = ', '.join(
+            f'{name};dur={duration:.1f};desc="{description}"'
+            for name, (duration, description) in timing.items()
+        )
+        match = request.resolver_match
+        view_name = match.view_name if match else '-'
+        logger.info(
+            'method=%s path=%s view=%s status=%s total_ms=%.1f db_ms=%.1f '
+            'db_queries=%d template_ms=%.1f',
+            request.method, request.path, view_name, response.status_code,
+            total_ms, timing['db'][0], len(queries), timing['tpl'][0],
+        )
+        if profiler is not None and total_ms >= settings.NOTES_PROFILE_SLOW_MS:
+            self.dump_profile(profiler, view_name)
+
+    def process_template_response(self, request, response):
+        # Рендеринг идёт сразу после process_template_response всех
+        # middleware, а post-render callback вызывается по его окончании.
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._template_duration += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def dump_profile(profiler, view_name):
+        directory = settings.NOTES_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory,
+            f'{view_name.replace(":", "-")}-{time.time_ns()}-{os.getpid()}'
+            '.prof',
+        )
+        profiler.dump_stats(path)
+        logger.warning('Профиль медленного запроса сохранён в %s', path)
+
+
+class MetricsMiddleware:
+    """Число и время запросов и SQL-запросов по маршрутам для /metrics.
+
+    Стоит первым в MIDDLEWARE, поэтому работает и синхронно, и
+    асинхронно: иначе под ASGI вся цепочка уходила бы в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with QueryCounter() as queries:
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        async with QueryCounter() as queries:
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started, queries)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, queries):
+        match = request.resolver_match
+        # Метки берутся из ограниченных наборов, чтобы число рядов
+        # не росло от произвольных путей и методов.
+        view = match.view_name if match else 'unmatched'
+        method = (
+            request.method if request.method in KNOWN_METHODS else 'other'
+        )
+        metrics.inc(
+            'notes_http_requests_total',
+            view=view, method=method, status=str(response.status_code),
+        )
+        metrics.observe(
+            'notes_http_request_duration_seconds', duration, view=view
+        )
+        metrics.inc('notes_db_queries_total', len(queries), view=view)
+        metrics.registry.maybe_flush()
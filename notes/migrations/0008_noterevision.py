@@ -0,0 +1,70 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Добавление поля пересоздаёт таблицу notes_note на SQLite и удаляет
+# триггеры полнотекстового индекса (см. 0005_note_fts): они снимаются до
+# пересоздания и ставятся заново после него, в том числе при откате.
+# Строки индекса не меняются - id заметок при копировании сохраняются.
+CREATE_FTS_TRIGGERS = (
+    """
+    CREATE TRIGGER notes_note_fts_insert AFTER INSERT ON notes_note BEGIN
+        INSERT INTO notes_note_fts(rowid, title, text)
+        VALUES (new.id, new.title, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER notes_note_fts_delete AFTER DELETE ON notes_note BEGIN
+        INSERT INTO notes_note_fts(notes_note_fts, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER notes_note_fts_update AFTER UPDATE OF title, text
+    ON notes_note BEGIN
+        INSERT INTO notes_note_fts(notes_note_fts, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO notes_note_fts(rowid, title, text)
+        VALUES (new.id, new.title, new.text);
+    END
+    """,
+)
+
+DROP_FTS_TRIGGERS = (
+    'DROP TRIGGER IF EXISTS notes_note_fts_update',
+    'DROP TRIGGER IF EXISTS notes_note_fts_delete',
+    'DROP TRIGGER IF EXISTS notes_note_fts_insert',
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0007_note_title_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_FTS_TRIGGERS, CREATE_FTS_TRIGGERS),
+        migrations.AddField(
+            model_name='note',
+            name='revision',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Версия'),
+        ),
+        migrations.CreateModel(
+            name='NoteRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='Номер версии')),
+                ('title', models.CharField(max_length=100, verbose_name='Заголовок')),
+                ('is_snapshot', models.BooleanField(default=False, verbose_name='Полный снимок')),
+                ('data', models.BinaryField(verbose_name='Сжатый текст или дельта')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('note', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='notes.note')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('note', 'number'), name='noterevision_note_number')],
+            },
+        ),
+        migrations.RunSQL(CREATE_FTS_TRIGGERS, DROP_FTS_TRIGGERS),
+    ]
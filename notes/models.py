@@ -1,7 +1,31 @@
+from functools import partial
+from itertools import count
+
 from django.conf import settings
-from django.db import models
+from django.db import (
+    IntegrityError, connections, models, router, transaction
+)
+from django.utils import timezone
+
+from . import metrics
+from .revisions import (
+    apply_delta, decode_snapshot, encode_delta, encode_snapshot
+)
+from .slugs import slugify
+
+LIST_FIELDS = ('id', 'slug', 'title')
+SLUG_SUFFIX_ATTEMPTS = 100
+
+
+class RevisionConflict(Exception):
+    """Заметку сохранили по устаревшей версии: её уже изменили."""
+
+
+class NoteQuerySet(models.QuerySet):
 
-from pytils.translit import slugify
+    def for_list(self):
+        """Только поля, нужные списку заметок, без тяжёлого text."""
+        return self.only(*LIST_FIELDS)
 
 
 class Note(models.Model):
@@ -27,12 +51,325 @@ class Note(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+    updated_at = models.DateTimeField('Изменена', auto_now=True)
+    revision = models.PositiveIntegerField(
+        'Версия', default=0, editable=False
+    )
+
+    objects = NoteQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            # Поиск в админке: точный slug или начало заголовка.
+            models.Index(fields=('title',), name='note_title_idx'),
+            # Покрывающий индекс для списка заметок: keyset-пагинация по
+            # (author, id), а slug и title читаются прямо из индекса.
+            models.Index(
+                fields=('author', 'id', 'slug', 'title'),
+                name='note_list_covering_idx',
+            ),
+            # Max(updated_at) по автору для условных GET-запросов.
+            models.Index(
+                fields=('author', 'updated_at'),
+                name='note_author_updated_idx',
+            ),
+        )
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        note = super().from_db(db, field_names, values)
+        # Сохранённые заголовок и текст: с ними сравнивается правка, от
+        # текста считается дельта новой версии. Отложенных полей нет.
+        note._stored_version = (
+            note.__dict__.get('title'), note.__dict__.get('text')
+        )
+        return note
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or {'title', 'text'} <= {*fields}:
+            self._stored_version = (
+                self.__dict__.get('title'), self.__dict__.get('text')
+            )
+        else:
+            # Часть полей могла устареть: при сохранении сохранённые
+            # заголовок и текст будут прочитаны из базы заново.
+            self._stored_version = (None, None)
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
+        """Сохраняет заметку, полагаясь на уникальный индекс по slug.
+
+        Заметка пишется в отдельном savepoint без предварительной проверки
+        slug. Если slug сгенерирован из заголовка (или включён
+        NOTES_SLUG_AUTO_SUFFIX), при конфликте к нему добавляется
+        числовой суффикс и запись повторяется, иначе IntegrityError
+        пробрасывается вызывающему коду.
+
+        Если заголовок или текст изменились, в той же транзакции
+        записывается новая версия заметки (NoteRevision). Если эту
+        версию уже записала другая правка, бросается RevisionConflict.
+        """
+        using = kwargs.get('using') or router.db_for_write(
+            type(self), instance=self
+        )
+        stored_revision = self.revision
+        versions, previous_text = self._new_versions(
+            using, kwargs.get('update_fields')
+        )
+        if versions:
+            self.revision = versions[-1][0]
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'],
+                                           'revision'}
+        max_slug_length = self._meta.get_field('slug').max_length
+        auto_slug = not self.slug
+        if auto_slug:
             self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        base_slug = self.slug
+        action = 'create' if self._state.adding else 'update'
+        for number in count(2):
+            try:
+                with transaction.atomic(using=using):
+                    super().save(*args, **kwargs)
+                    NoteChange.objects.using(using).record(
+                        self, NoteChange.UPSERT
+                    )
+                    NoteRevision.objects.using(using).record(
+                        self, versions, previous_text
+                    )
+                break
+            except IntegrityError:
+                if versions and self._revision_is_taken(using, versions):
+                    self.revision = stored_revision
+                    raise RevisionConflict(
+                        f'Версия {versions[0][0]} заметки уже записана.'
+                    )
+                if (not (auto_slug or settings.NOTES_SLUG_AUTO_SUFFIX)
+                        or number > SLUG_SUFFIX_ATTEMPTS
+                        or not self._slug_is_taken(using)):
+                    self.revision = stored_revision
+                    raise
+                suffix = f'-{number}'
+                self.slug = base_slug[:max_slug_length - len(suffix)] + suffix
+        self._stored_version = (self.title, self.text)
+        transaction.on_commit(
+            partial(metrics.inc, 'notes_note_changes_total', action=action),
+            using=using,
+        )
+
+    def _new_versions(self, using, update_fields=None):
+        """Версии, которые добавит сохранение, и текст перед ними.
+
+        Возвращает список (номер, заголовок, текст) и прежний текст
+        заметки (None для новой). Заметка, созданная до истории версий
+        или через bulk_create, при первой правке сначала получает версию
+        со своим прежним содержимым.
+        """
+        if update_fields is not None and not {'title', 'text'} & set(
+            update_fields
+        ):
+            return [], None
+        if self._state.adding:
+            return [(1, self.title, self.text)], None
+        stored = getattr(self, '_stored_version', (None, None))
+        if None in stored:
+            row = type(self).objects.using(using).filter(
+                pk=self.pk
+            ).values_list('title', 'text', 'revision').first()
+            if row is None:
+                return [(1, self.title, self.text)], None
+            stored, self.revision = row[:2], row[2]
+        if stored == (self.title, self.text):
+            return [], None
+        versions = []
+        if self.revision == 0:
+            versions.append((1, *stored))
+        number = self.revision + len(versions) + 1
+        versions.append((number, self.title, self.text))
+        return versions, stored[1]
+
+    def _revision_is_taken(self, using, versions):
+        """Проверяет, что IntegrityError вызван занятым номером версии."""
+        return not self._state.adding and NoteRevision.objects.using(
+            using
+        ).filter(note_id=self.pk, number=versions[0][0]).exists()
+
+    def _slug_is_taken(self, using):
+        """Проверяет, что IntegrityError вызван именно занятым slug."""
+        return type(self).objects.using(using).filter(
+            slug=self.slug
+        ).exclude(pk=self.pk).exists()
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            # Надгробие пишется до удаления, пока у заметки есть id.
+            NoteChange.objects.using(using).record(self, NoteChange.DELETE)
+            result = super().delete(using=using, keep_parents=keep_parents)
+        transaction.on_commit(
+            partial(metrics.inc, 'notes_note_changes_total', action='delete'),
+            using=using,
+        )
+        return result
+
+
+class NoteRevisionQuerySet(models.QuerySet):
+
+    def record(self, note, versions, previous_text=None):
+        """Добавляет версии заметки одним INSERT.
+
+        versions - список (номер, заголовок, текст) по возрастанию номера,
+        previous_text - текст версии перед первой из них. Каждая
+        NOTES_REVISION_SNAPSHOT_EVERY-я версия хранится полным снимком,
+        остальные - дельтой от предыдущей.
+        """
+        revisions = []
+        for number, title, text in versions:
+            is_snapshot = (
+                previous_text is None
+                or (number - 1) % settings.NOTES_REVISION_SNAPSHOT_EVERY == 0
+            )
+            revisions.append(self.model(
+                note_id=note.pk,
+                number=number,
+                title=title,
+                is_snapshot=is_snapshot,
+                data=(
+                    encode_snapshot(text) if is_snapshot
+                    else encode_delta(previous_text, text)
+                ),
+            ))
+            previous_text = text
+        return self.bulk_create(revisions)
+
+    def text_of(self, revision):
+        """Текст версии: ближайший снимок и дельты после него.
+
+        Цепочка читается одним запросом и не длиннее
+        NOTES_REVISION_SNAPSHOT_EVERY версий.
+        """
+        versions = self.filter(note_id=revision.note_id)
+        chain = versions.filter(
+            number__lte=revision.number,
+            number__gte=models.Subquery(
+                versions.filter(
+                    number__lte=revision.number, is_snapshot=True
+                ).order_by('-number').values('number')[:1]
+            ),
+        ).order_by('number').values_list('is_snapshot', 'data')
+        text = ''
+        for is_snapshot, data in chain:
+            text = (
+                decode_snapshot(data) if is_snapshot
+                else apply_delta(text, data)
+            )
+        return text
+
+
+class NoteRevision(models.Model):
+    """Версия заметки: снимок текста или дельта от предыдущей версии.
+
+    Номер версии совпадает с Note.revision на момент сохранения.
+    Уникальность (note, number) не даёт двум одновременным правкам одной
+    версии записать дельты от одного и того же текста.
+    """
+    note = models.ForeignKey(
+        Note,
+        on_delete=models.CASCADE,
+        related_name='revisions',
+        # Версии заметки ищет уникальный индекс (note, number).
+        db_index=False,
+    )
+    number = models.PositiveIntegerField('Номер версии')
+    title = models.CharField('Заголовок', max_length=100)
+    is_snapshot = models.BooleanField('Полный снимок', default=False)
+    data = models.BinaryField('Сжатый текст или дельта')
+    created_at = models.DateTimeField('Создана', auto_now_add=True)
+
+    objects = NoteRevisionQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('note', 'number'), name='noterevision_note_number'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.note_id}.{self.number}'
+
+    def get_text(self):
+        return type(self).objects.using(self._state.db).text_of(self)
+
+
+class NoteChangeQuerySet(models.QuerySet):
+
+    def record(self, note, action):
+        """Добавляет запись об изменении заметки в журнал автора."""
+        return self.create(
+            author_id=note.author_id,
+            note_id=note.pk,
+            slug=note.slug,
+            action=action,
+        )
+
+    def record_queryset(self, notes, action):
+        """Записывает изменение всех заметок выборки одним INSERT ... SELECT.
+
+        Возвращает число добавленных записей.
+        """
+        select = notes.annotate(
+            change_action=models.Value(action),
+            changed_at=models.Value(
+                timezone.now(), output_field=models.DateTimeField()
+            ),
+        ).values_list('author_id', 'id', 'slug', 'change_action', 'changed_at')
+        sql, params = select.query.get_compiler(self.db).as_sql()
+        table = connections[self.db].ops.quote_name(self.model._meta.db_table)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} '
+                f'(author_id, note_id, slug, action, created_at) {sql}',
+                params,
+            )
+            return cursor.rowcount
+
+
+class NoteChange(models.Model):
+    """Журнал изменений заметок для инкрементальной синхронизации.
+
+    id записи служит номером последовательности: SQLite выполняет запись
+    строго по очереди, поэтому номера фиксируются по возрастанию и клиенту
+    достаточно помнить последний полученный номер. Удалённые заметки
+    остаются в журнале записями-надгробиями.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTIONS = (
+        (UPSERT, 'Создание или изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='note_changes',
+    )
+    note_id = models.BigIntegerField('ID заметки')
+    slug = models.SlugField('Адрес заметки', max_length=100, db_index=False)
+    action = models.CharField('Действие', max_length=6, choices=ACTIONS)
+    created_at = models.DateTimeField('Время изменения', auto_now_add=True)
+
+    objects = NoteChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = (
+            # Выборка изменений автора после заданного номера.
+            models.Index(
+                fields=('author', 'id'), name='notechange_author_seq_idx'
+            ),
+        )
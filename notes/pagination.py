@@ -0,0 +1,68 @@
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+
+def encode_cursor(pk):
+    """Превращает id последней заметки страницы в непрозрачный токен."""
+    return urlsafe_base64_encode(force_bytes(pk))
+
+
+def decode_cursor(token):
+    """Достаёт id из токена; при некорректном значении - ValueError."""
+    pk = int(force_str(urlsafe_base64_decode(token)))
+    if pk < 0:
+        raise ValueError('Курсор не может быть отрицательным.')
+    return pk
+
+
+def paginate_by_cursor(queryset, cursor, page_size):
+    """Keyset-пагинация по id.
+
+    Вместо OFFSET берёт заметки с id больше курсора, поэтому любая
+    страница обходится так же дёшево, как первая. Возвращает список
+    объектов страницы и токен следующей страницы (None, если она последняя).
+    """
+    queryset = _page_queryset(queryset, cursor, page_size)
+    return _split_page(list(queryset), page_size)
+
+
+async def apaginate_by_cursor(queryset, cursor, page_size):
+    """Асинхронный вариант paginate_by_cursor."""
+    queryset = _page_queryset(queryset, cursor, page_size)
+    return _split_page([item async for item in queryset], page_size)
+
+
+def _page_queryset(queryset, cursor, page_size):
+    queryset = queryset.order_by('id')
+    if cursor:
+        queryset = queryset.filter(id__gt=decode_cursor(cursor))
+    # Лишний объект показывает, что за страницей есть продолжение.
+    return queryset[:page_size + 1]
+
+
+def _split_page(page, page_size):
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1].pk)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator без точного COUNT(*) по всей таблице.
+
+    Для выборки без фильтров число строк оценивается по наибольшему id:
+    это один шаг по первичному ключу, а пропуски от удалённых заметок
+    только добавляют пустые последние страницы. Отфильтрованная выборка
+    считается точно, но не дальше count_limit строк.
+    """
+    count_limit = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return queryset.aggregate(last_id=Max('pk'))['last_id'] or 0
+        return queryset.order_by()[:self.count_limit].count()
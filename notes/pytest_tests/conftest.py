@@ -6,12 +6,22 @@
     объект заметки.
 """
 
+from importlib import reload
+
 import pytest
 # Импортируем класс клиента.
 from django.test.client import Client
+from django.urls import clear_url_caches
+
+import notes.urls
+import yanote.urls
 
+from notes import metrics
+from notes.cache import get_notes_cache
+from notes.middleware import user_cache
 # Импортируем модель заметки, чтобы создать экземпляр.
 from notes.models import Note
+from notes.querybudget import QueryBudget
 
 
 @pytest.fixture
@@ -57,10 +67,58 @@ def slug_for_args(note):
     # На то, что это кортеж, указывает запятая в конце выражения.
     return (note.slug,)
 
+
+@pytest.fixture
+def revision_args(note):
+    # slug заметки и номер её первой версии, созданной вместе с ней.
+    return (note.slug, 1)
+
 @pytest.fixture
 def form_data():
     return {
         'title': 'Новый заголовок',
         'text': 'Новый текст',
         'slug': 'new-slug'
-    } 
\ No newline at end of file
+    } 
+
+
+@pytest.fixture(autouse=True)
+def clear_notes_cache():
+    # Кэши живут между тестами, а id пользователей повторяются.
+    get_notes_cache().clear()
+    user_cache.clear()
+    metrics.registry.clear()
+
+
+@pytest.fixture
+def async_note_views(settings):
+    """Переключает маршруты заметок на асинхронные CBV."""
+    def reload_urls():
+        reload(notes.urls)
+        reload(yanote.urls)
+        clear_url_caches()
+
+    settings.NOTES_ASYNC_VIEWS = True
+    reload_urls()
+    yield
+    settings.NOTES_ASYNC_VIEWS = False
+    reload_urls()
+
+
+@pytest.fixture
+def query_budget():
+    """Контекстный менеджер, проверяющий бюджет запросов маршрута.
+
+    Пример: with query_budget('notes:list'): ...
+    """
+    return QueryBudget
+
+
+@pytest.fixture
+def many_notes(author):
+    # На нескольких заметках N+1 в шаблоне сразу выходит за бюджет.
+    return Note.objects.bulk_create(
+        Note(title=f'Заметка {number}', text='Текст',
+             slug=f'note-{number}', author=author)
+        for number in range(30)
+    )
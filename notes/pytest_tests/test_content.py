@@ -1,5 +1,16 @@
+from http import HTTPStatus
+
+import pytest
+from django.test.client import Client
 from django.urls import reverse
+from pytest_lazy_fixtures import lf
+from pytest_django.asserts import assertRedirects
 from notes.forms import NoteForm
+from notes.models import Note, NoteChange
+from notes.views import NotesList
+
+SIGNED_COOKIES_SESSIONS = 'django.contrib.sessions.backends.signed_cookies'
+
 
 # В тесте используем фикстуру заметки
 # и фикстуру клиента с автором заметки.
@@ -63,4 +74,207 @@ def test_edit_note_page_contains_form(slug_for_args, author_client):
     # Проверяем, есть ли объект form в словаре контекста:
     assert 'form' in response.context
     # Проверяем, что объект формы относится к нужному классу.
-    assert isinstance(response.context['form'], NoteForm) 
\ No newline at end of file
+    assert isinstance(response.context['form'], NoteForm) 
+
+
+def test_notes_list_cursor_pagination(author, author_client, monkeypatch):
+    monkeypatch.setattr(NotesList, 'paginate_by', 2)
+    notes = Note.objects.bulk_create(
+        Note(title=f'Заметка {index}', text='Текст',
+             slug=f'note-{index}', author=author)
+        for index in range(3)
+    )
+    url = reverse('notes:list')
+    response = author_client.get(url)
+    assert list(response.context['object_list']) == notes[:2]
+    # По курсору со второй страницы отдаётся оставшаяся заметка:
+    response = author_client.get(
+        url, {'after': response.context['next_cursor']}
+    )
+    assert list(response.context['object_list']) == notes[2:]
+    assert response.context['next_cursor'] is None
+
+
+def test_notes_list_invalid_cursor(author_client):
+    response = author_client.get(reverse('notes:list'), {'after': '!!!'})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_notes_list_does_not_load_text(note, author_client):
+    response = author_client.get(reverse('notes:list'))
+    listed_note, = response.context['object_list']
+    assert 'text' in listed_note.get_deferred_fields()
+
+
+def test_notes_list_served_from_cache(
+        author, note, settings, django_assert_num_queries
+):
+    settings.SESSION_ENGINE = SIGNED_COOKIES_SESSIONS
+    client = Client()
+    client.force_login(author)
+    url = reverse('notes:list')
+    client.get(url)
+    # Повторный запрос: только версия списка для ETag и ключа кэша, без
+    # выборки заметок; сессия хранится в cookie, пользователь - в кэше.
+    with django_assert_num_queries(1):
+        response = client.get(url)
+    assert note.title in response.content.decode()
+
+
+def test_notes_list_cache_invalidated_on_write(
+        note, author_client, form_data, django_capture_on_commit_callbacks
+):
+    url = reverse('notes:list')
+    author_client.get(url)
+    with django_capture_on_commit_callbacks(execute=True):
+        author_client.post(reverse('notes:add'), data=form_data)
+    assert form_data['title'] in author_client.get(url).content.decode()
+    with django_capture_on_commit_callbacks(execute=True):
+        author_client.post(reverse('notes:delete', args=(note.slug,)))
+    assert note.title not in author_client.get(url).content.decode()
+
+
+def test_notes_list_cache_sees_writes_of_other_processes(note, author_client):
+    url = reverse('notes:list')
+    author_client.get(url)
+    # Так выглядит запись другого процесса: кэш этого процесса о ней
+    # ничего не знает, меняется только журнал изменений в базе.
+    Note.objects.filter(pk=note.pk).update(title='Из другого процесса')
+    NoteChange.objects.record(note, NoteChange.UPSERT)
+    assert 'Из другого процесса' in author_client.get(url).content.decode()
+
+
+@pytest.mark.parametrize(
+    'name, args',
+    (
+        ('notes:list', None),
+        ('notes:detail', lf('slug_for_args')),
+    ),
+)
+def test_conditional_get_not_modified(author_client, note, name, args):
+    url = reverse(name, args=args)
+    etag = author_client.get(url)['ETag']
+    response = author_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    # После изменения заметки ETag перестаёт совпадать:
+    note.save()
+    response = author_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_notes_list_etag_differs_between_authors(author_client,
+                                                 not_author_client, author):
+    # Заметка без записи в журнале, как созданные до журнала изменений.
+    Note.objects.bulk_create([
+        Note(title='Старая', text='Текст', slug='old', author=author)
+    ])
+    url = reverse('notes:list')
+    etag = not_author_client.get(url)['ETag']
+    response = author_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] != etag
+
+
+def test_note_detail_last_modified(author_client, note):
+    url = reverse('notes:detail', args=(note.slug,))
+    last_modified = author_client.get(url)['Last-Modified']
+    response = author_client.get(
+        url, headers={'If-Modified-Since': last_modified}
+    )
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_search_finds_own_notes_with_highlight(
+        author, not_author, author_client
+):
+    note = Note.objects.create(
+        title='Покупки', text='Купить <молоко> и хлеб', author=author
+    )
+    Note.objects.create(
+        title='Покупки соседа', text='Купить молоко', author=not_author
+    )
+    response = author_client.get(reverse('notes:search'), {'q': 'молок'})
+    result, = response.context['results']
+    assert result.slug == note.slug
+    assert '&lt;<mark>молоко</mark>&gt;' in result.snippet
+
+
+def test_search_follows_note_updates(note, author_client):
+    note.text = 'Совершенно новый текст'
+    note.save()
+    url = reverse('notes:search')
+    assert author_client.get(url, {'q': 'новый'}).context['results']
+    assert not author_client.get(
+        url, {'q': 'заметки'}
+    ).context['results']
+
+
+def test_note_detail_single_query(
+        author, note, settings, django_assert_num_queries
+):
+    settings.SESSION_ENGINE = SIGNED_COOKIES_SESSIONS
+    client = Client()
+    client.force_login(author)
+    url = reverse('notes:detail', args=(note.slug,))
+    client.get(url)
+    # Сессия в cookie, пользователь в кэше процесса: остаётся только
+    # выборка самой заметки.
+    with django_assert_num_queries(1):
+        response = client.get(url)
+    assert response.context['note'] == note
+
+
+def test_password_change_logs_out_cached_sessions(
+        author, author_client, django_capture_on_commit_callbacks
+):
+    url = reverse('notes:list')
+    assert author_client.get(url).status_code == HTTPStatus.OK
+    with django_capture_on_commit_callbacks(execute=True):
+        author.set_password('новый-пароль')
+        author.save()
+    response = author_client.get(url)
+    assertRedirects(response, f'{reverse("users:login")}?next={url}')
+
+
+@pytest.fixture
+def jinja2_templates(settings):
+    pytest.importorskip('jinja2')
+    settings.TEMPLATES = [settings.JINJA2_TEMPLATES, *settings.TEMPLATES]
+
+
+@pytest.mark.usefixtures('jinja2_templates')
+@pytest.mark.parametrize(
+    'name, args, expected',
+    (
+        ('notes:list', None, '<a href="/note/note-slug/"> Заголовок</a>'),
+        ('notes:detail', lf('slug_for_args'), 'href="/edit/note-slug/"'),
+        ('notes:edit', lf('slug_for_args'), 'name="csrfmiddlewaretoken"'),
+        ('notes:search', None, 'Поиск по заметкам'),
+        ('notes:revisions', lf('slug_for_args'),
+         'href="/note/note-slug/revisions/1/"'),
+        ('notes:revision', lf('revision_args'), 'name="csrfmiddlewaretoken"'),
+    ),
+)
+def test_jinja2_templates(author_client, note, name, args, expected):
+    response = author_client.get(reverse(name, args=args))
+    assert response.status_code == HTTPStatus.OK
+    content = response.content.decode()
+    assert expected in content
+    assert f'пользователя {note.author.username}' in content
+
+
+def test_stylesheet_is_served_locally(client):
+    content = client.get(reverse('notes:home')).content.decode()
+    assert 'href="/static/css/bootstrap.min.css"' in content
+    assert 'cdn.jsdelivr.net' not in content
+
+
+@pytest.mark.usefixtures('many_notes')
+def test_notes_list_is_gzipped(author_client):
+    response = author_client.get(
+        reverse('notes:list'), headers={'Accept-Encoding': 'gzip'}
+    )
+    assert response['Content-Encoding'] == 'gzip'
+    assert int(response['Content-Length']) < len(
+        author_client.get(reverse('notes:list')).content
+    )
@@ -1,17 +1,38 @@
 # test_logic.py
+import json
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+
 from pytest_django.asserts import assertRedirects
 
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.http import HttpResponse
 from django.urls import reverse
 
-from notes.models import Note
+from django.contrib.admin import helpers
+from notes.models import Note, NoteChange, NoteRevision, RevisionConflict
 import pytest
+from asgiref.sync import async_to_sync
 # Импортируем функции для проверки редиректа и ошибки формы:
 from pytest_django.asserts import assertRedirects, assertFormError
 
 # Импортируем из модуля forms сообщение об ошибке:
-from notes.forms import WARNING
+from notes.forms import CONFLICT, SAVE_CANCELLED, SAVE_PENDING, WARNING
 # Дополнительно импортируем функцию slugify.
 from pytils.translit import slugify
+
+from notes import metrics, middleware
+from notes.middleware import PrimaryPinningMiddleware
+from notes.pagination import EstimatedCountPaginator
+from notes.services import delete_author_notes
+from notes.revisions import encode_delta, encode_snapshot
+from notes.routers import ReplicaRouter, use_primary
+from notes.slugs import slugify as fast_slugify
+import notes.writer
+from notes.writer import writer
 # Допишите импорт класса со статусами HTTP-ответов.
 from http import HTTPStatus
 
@@ -120,4 +141,758 @@ def test_other_user_cant_delete_note(not_author_client, slug_for_args):
     url = reverse('notes:delete', args=slug_for_args)
     response = not_author_client.post(url)
     assert response.status_code == HTTPStatus.NOT_FOUND
-    assert Note.objects.count() == 1 
\ No newline at end of file
+    assert Note.objects.count() == 1 
+
+
+def test_generated_slug_gets_suffix(author_client, author, form_data):
+    form_data.pop('slug')
+    note = Note.objects.create(
+        title=form_data['title'], text='Текст', author=author
+    )
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertRedirects(response, reverse('notes:success'))
+    new_note = Note.objects.exclude(pk=note.pk).get()
+    assert new_note.slug == f'{slugify(note.title)}-2'
+
+
+def test_not_unique_slug_auto_suffix(author_client, note, form_data, settings):
+    settings.NOTES_SLUG_AUTO_SUFFIX = True
+    form_data['slug'] = note.slug
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertRedirects(response, reverse('notes:success'))
+    assert Note.objects.filter(slug=f'{note.slug}-2').exists()
+
+
+@pytest.mark.parametrize(
+    'title',
+    (
+        'Заголовок новой заметки',
+        'Щука & «ёжик» — №1…',
+        'Съешь же ещё этих мягких французских булок',
+        '  Tab\tи\nперевод   строки &amp; ß İ 漢字 ',
+        '',
+    ),
+)
+def test_fast_slugify_matches_pytils(title):
+    assert fast_slugify(title) == slugify(title)
+
+
+def test_import_notes_allocates_unique_slugs(author, note, tmp_path):
+    source = tmp_path / 'notes.jsonl'
+    lines = (
+        {'title': 'Первая', 'text': 'Текст', 'slug': note.slug},
+        {'title': 'Вторая', 'text': 'Текст', 'slug': note.slug},
+        {'title': 'Третья', 'text': 'Текст'},
+    )
+    source.write_text(
+        '\n'.join(json.dumps(data, ensure_ascii=False) for data in lines),
+        encoding='utf-8',
+    )
+    call_command(
+        'import_notes', author.username, str(source), batch_size=2,
+        stderr=StringIO(),
+    )
+    assert set(Note.objects.values_list('slug', flat=True)) == {
+        note.slug, f'{note.slug}-2', f'{note.slug}-3', slugify('Третья'),
+    }
+
+
+def test_import_notes_falls_back_for_empty_slug(author, tmp_path):
+    source = tmp_path / 'notes.jsonl'
+    source.write_text(
+        '{"title": "!!!", "text": "Текст"}\n{"title": "?", "text": "Текст"}',
+        encoding='utf-8',
+    )
+    call_command('import_notes', author.username, str(source),
+                 stderr=StringIO())
+    assert set(Note.objects.values_list('slug', flat=True)) == {
+        'note', 'note-2'
+    }
+
+
+@pytest.mark.parametrize('line', (
+    '{"title": "Заметка", "text": ["Текст"]}',
+    '{"title": 5, "text": "Текст"}',
+))
+def test_import_notes_rejects_non_string_fields(author, tmp_path, line):
+    source = tmp_path / 'notes.jsonl'
+    source.write_text(line, encoding='utf-8')
+    with pytest.raises(CommandError, match='Строка 1'):
+        call_command('import_notes', author.username, str(source),
+                     stderr=StringIO())
+    assert not Note.objects.exists()
+
+
+def test_export_notes(author, note):
+    stdout = StringIO()
+    call_command('export_notes', author.username, stdout=stdout,
+                 stderr=StringIO())
+    exported, = map(json.loads, stdout.getvalue().splitlines())
+    assert exported['slug'] == note.slug
+    assert exported['text'] == note.text
+
+
+def test_api_create_and_patch_note(author_client, author, form_data):
+    response = author_client.post(
+        reverse('notes:api-list'), form_data, content_type='application/json'
+    )
+    assert response.status_code == HTTPStatus.CREATED
+    assert response.json()['slug'] == form_data['slug']
+    response = author_client.patch(
+        reverse('notes:api-detail', args=(form_data['slug'],)),
+        {'text': 'Исправленный текст'}, content_type='application/json',
+    )
+    assert response.status_code == HTTPStatus.OK
+    note = Note.objects.get()
+    assert note.author == author
+    assert note.title == form_data['title']
+    assert note.text == 'Исправленный текст'
+
+
+def test_api_not_unique_slug(author_client, note, form_data):
+    form_data['slug'] = note.slug
+    response = author_client.post(
+        reverse('notes:api-list'), form_data, content_type='application/json'
+    )
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.json()['errors']['slug'] == [note.slug + WARNING]
+
+
+def test_api_batch_applies_all_operations(author_client, note, form_data):
+    operations = [
+        {'op': 'create', 'data': form_data},
+        {'op': 'update', 'slug': note.slug, 'data': {'title': 'Новое'}},
+        {'op': 'delete', 'slug': form_data['slug']},
+    ]
+    response = author_client.post(
+        reverse('notes:api-batch'), {'operations': operations},
+        content_type='application/json',
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert len(response.json()['results']) == 3
+    assert list(Note.objects.values_list('title', flat=True)) == ['Новое']
+
+
+def test_api_batch_is_atomic(author_client, note, form_data):
+    operations = [
+        {'op': 'create', 'data': form_data},
+        {'op': 'delete', 'slug': 'no-such-note'},
+    ]
+    response = author_client.post(
+        reverse('notes:api-batch'), {'operations': operations},
+        content_type='application/json',
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert response.json()['errors']['index'] == 1
+    assert Note.objects.count() == 1
+
+
+def test_api_changes_since(author_client, note, form_data):
+    url = reverse('notes:api-changes')
+    last_seq = author_client.get(url).json()['last_seq']
+    author_client.post(reverse('notes:add'), data=form_data)
+    author_client.post(reverse('notes:edit', args=(note.slug,)), data={
+        'title': 'Новое', 'text': note.text, 'slug': note.slug,
+    })
+    author_client.post(reverse('notes:delete', args=(form_data['slug'],)))
+    changes = author_client.get(url, {'since': last_seq}).json()['changes']
+    assert [
+        (change['action'], change['slug']) for change in changes
+    ] == [('upsert', note.slug), ('delete', form_data['slug'])]
+    assert changes[0]['note']['title'] == 'Новое'
+
+
+@pytest.mark.usefixtures('async_note_views')
+def test_async_views_create_edit_delete(author_client, author, form_data):
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertRedirects(response, reverse('notes:success'))
+    note = Note.objects.get()
+    assert note.author == author
+    response = author_client.get(reverse('notes:list'))
+    assert note.title in response.content.decode()
+    form_data['text'] = 'Асинхронная правка'
+    response = author_client.post(
+        reverse('notes:edit', args=(note.slug,)), data=form_data
+    )
+    assertRedirects(response, reverse('notes:success'))
+    note.refresh_from_db()
+    assert note.text == form_data['text']
+    response = author_client.post(reverse('notes:delete', args=(note.slug,)))
+    assertRedirects(response, reverse('notes:success'))
+    assert Note.objects.count() == 0
+
+
+@pytest.mark.usefixtures('async_note_views')
+def test_async_not_unique_slug(author_client, note, form_data):
+    form_data['slug'] = note.slug
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertFormError(
+        response.context['form'], 'slug', errors=(note.slug + WARNING)
+    )
+    assert Note.objects.count() == 1
+
+
+def test_replica_router(settings):
+    settings.NOTES_READ_REPLICA = 'replica'
+    router = ReplicaRouter()
+    assert router.db_for_read(Note) == 'replica'
+    assert router.db_for_write(Note) == 'default'
+    token = use_primary.set(True)
+    try:
+        assert router.db_for_read(Note) is None
+    finally:
+        use_primary.reset(token)
+
+
+@pytest.mark.parametrize(
+    'method, cookies, pinned',
+    (
+        ('get', {}, False),
+        ('post', {}, True),
+        ('get', {PrimaryPinningMiddleware.cookie_name: '1'}, True),
+    ),
+)
+def test_primary_pinning_middleware(rf, method, cookies, pinned):
+    seen = []
+
+    def get_response(request):
+        seen.append(use_primary.get())
+        return HttpResponse()
+
+    request = getattr(rf, method)('/')
+    request.COOKIES.update(cookies)
+    response = PrimaryPinningMiddleware(get_response)(request)
+    assert seen == [pinned]
+    assert (PrimaryPinningMiddleware.cookie_name in response.cookies) is (
+        method == 'post'
+    )
+
+
+@pytest.fixture
+def server_timing(settings, tmp_path):
+    middleware = 'notes.middleware.ServerTimingMiddleware'
+    if middleware not in settings.MIDDLEWARE:
+        settings.MIDDLEWARE = [middleware, *settings.MIDDLEWARE]
+    settings.NOTES_PROFILE_DIR = tmp_path
+    return tmp_path
+
+
+def test_server_timing_header(server_timing, author_client, note, caplog):
+    with caplog.at_level('INFO', logger='notes.performance'):
+        response = author_client.get(reverse('notes:list'))
+    metrics = {
+        item.split(';')[0]: item
+        for item in response.headers['Server-Timing'].split(', ')
+    }
+    assert set(metrics) == {'db', 'tpl', 'total'}
+    assert metrics['db'].endswith('desc="4 queries"')
+    assert 'view=notes:list status=200' in caplog.text
+    assert not list(server_timing.iterdir())
+
+
+def test_server_timing_counts_list_fragment(
+        server_timing, author_client, note, monkeypatch
+):
+    render = middleware.render_to_string
+
+    def slow_render(*args, **kwargs):
+        time.sleep(0.05)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(middleware, 'render_to_string', slow_render)
+    response = author_client.get(reverse('notes:list'))
+    # Фрагмент рендерит сама view через render_timed, он тоже в tpl.
+    tpl = response.headers['Server-Timing'].split(', ')[1]
+    assert float(tpl.split(';')[1].removeprefix('dur=')) >= 50
+
+
+@pytest.mark.usefixtures('async_note_views')
+def test_server_timing_under_asgi(server_timing, async_client, author, note):
+    async_client.force_login(author)
+    response = async_to_sync(async_client.get)(reverse('notes:list'))
+    assert 'desc="0 queries"' not in response.headers['Server-Timing']
+
+
+def test_server_timing_profiles_slow_requests(
+        server_timing, author_client, note, settings
+):
+    settings.NOTES_PROFILE_SAMPLE_RATE = 1
+    settings.NOTES_PROFILE_SLOW_MS = 0
+    author_client.get(reverse('notes:detail', args=(note.slug,)))
+    profile, = server_timing.iterdir()
+    assert profile.name.startswith('notes-detail-')
+
+
+def test_metrics_endpoint(
+        author_client, form_data, django_capture_on_commit_callbacks
+):
+    with django_capture_on_commit_callbacks(execute=True):
+        author_client.post(reverse('notes:add'), data=form_data)
+    author_client.get(reverse('notes:list'))
+    author_client.get(reverse('notes:list'))
+    response = author_client.get(reverse('notes:metrics'))
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    lines = response.content.decode().splitlines()
+    assert 'notes_note_changes_total{action="create"} 1' in lines
+    assert 'notes_cache_requests_total{result="hit"} 1' in lines
+    assert 'notes_cache_hit_ratio 0.5' in lines
+    assert (
+        'notes_http_requests_total{method="POST",status="302",'
+        'view="notes:add"} 1'
+    ) in lines
+    assert (
+        'notes_http_request_duration_seconds_bucket{le="+Inf",'
+        'view="notes:list"} 2'
+    ) in lines
+
+
+@pytest.mark.usefixtures('async_note_views')
+def test_metrics_under_asgi(async_client, author, note):
+    async_client.force_login(author)
+    async_to_sync(async_client.get)(reverse('notes:detail', args=(note.slug,)))
+    lines = metrics.render().splitlines()
+    assert (
+        'notes_http_requests_total{method="GET",status="200",'
+        'view="notes:detail"} 1'
+    ) in lines
+    # Запросы асинхронной view считаются в потоке sync_to_async.
+    assert any(
+        line.startswith('notes_db_queries_total{view="notes:detail"} ')
+        and not line.endswith(' 0')
+        for line in lines
+    )
+
+
+def test_metrics_are_merged_across_processes(client, settings, tmp_path):
+    settings.NOTES_METRICS_DIR = tmp_path
+    (tmp_path / 'other-process.json').write_text(json.dumps([
+        ['notes_note_changes_total', [['action', 'delete']], 2],
+    ]))
+    metrics.inc('notes_note_changes_total', action='delete')
+    response = client.get(reverse('notes:metrics'))
+    assert 'notes_note_changes_total{action="delete"} 3' in (
+        response.content.decode().splitlines()
+    )
+
+
+def test_metrics_token(client, settings):
+    settings.NOTES_METRICS_TOKEN = 'secret'
+    url = reverse('notes:metrics')
+    assert client.get(url).status_code == HTTPStatus.FORBIDDEN
+    response = client.get(url, headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_export_markdown_zip(author_client, note, not_author):
+    Note.objects.create(
+        title='Чужая', text='Текст', slug='other', author=not_author
+    )
+    response = author_client.get(reverse('notes:export'))
+    assert response.streaming
+    assert response['Content-Type'] == 'application/zip'
+    archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+    assert archive.namelist() == [f'{note.slug}.md']
+    assert archive.read(f'{note.slug}.md').decode() == (
+        f'# {note.title}\n\n{note.text}\n'
+    )
+
+
+def test_export_jsonl(author_client, note):
+    response = author_client.get(reverse('notes:export'), {'format': 'jsonl'})
+    exported, = map(
+        json.loads, b''.join(response.streaming_content).splitlines()
+    )
+    assert exported['slug'] == note.slug
+
+
+@pytest.mark.parametrize('name, gzipped', (('zip', False), ('jsonl', True)))
+def test_export_gzip_only_uncompressed(author_client, note, name, gzipped):
+    response = author_client.get(
+        reverse('notes:export'), {'format': name},
+        headers={'Accept-Encoding': 'gzip'},
+    )
+    assert (response.get('Content-Encoding') == 'gzip') is gzipped
+    if not gzipped:
+        archive = zipfile.ZipFile(
+            BytesIO(b''.join(response.streaming_content))
+        )
+        assert archive.namelist() == [f'{note.slug}.md']
+
+
+def test_export_unknown_format(author_client):
+    response = author_client.get(reverse('notes:export'), {'format': 'pdf'})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_admin_search_by_slug_and_title_prefix(admin_client, note):
+    Note.objects.create(
+        title='Другая', text='Текст', slug='other', author=note.author
+    )
+    url = reverse('admin:notes_note_changelist')
+    for term in (note.slug, note.title[:4]):
+        response = admin_client.get(url, {'q': term})
+        assert list(response.context['cl'].result_list) == [note]
+
+
+def test_admin_reassign_author(admin_client, author, note, not_author):
+    response = admin_client.post(reverse('admin:notes_note_changelist'), {
+        'action': 'reassign_author',
+        helpers.ACTION_CHECKBOX_NAME: [note.pk],
+        'author': not_author.username,
+    })
+    assert response.status_code == HTTPStatus.FOUND
+    note.refresh_from_db()
+    assert note.author == not_author
+    assert list(
+        NoteChange.objects.order_by('id').values_list('author', 'action')
+    ) == [
+        (author.pk, NoteChange.UPSERT),
+        (author.pk, NoteChange.DELETE),
+        (not_author.pk, NoteChange.UPSERT),
+    ]
+
+
+def test_admin_delete_by_author(admin_client, author, note, not_author):
+    Note.objects.create(title='Вторая', text='Текст', author=author)
+    other = Note.objects.create(title='Чужая', text='Текст', author=not_author)
+    url = reverse('admin:notes_note_changelist')
+    data = {
+        'action': 'delete_by_author',
+        helpers.ACTION_CHECKBOX_NAME: [note.pk],
+    }
+    response = admin_client.post(url, data)
+    assert response.status_code == HTTPStatus.OK
+    assert response.context['notes_count'] == 2
+    response = admin_client.post(url, {**data, 'post': 'yes'})
+    assert response.status_code == HTTPStatus.FOUND
+    assert list(Note.objects.all()) == [other]
+    assert NoteChange.objects.filter(
+        author=author, action=NoteChange.DELETE
+    ).count() == 2
+
+
+def test_admin_change_form_moves_note(admin_client, author_client, author,
+                                      note, not_author):
+    list_url = reverse('notes:list')
+    response = author_client.get(list_url)
+    assert note in response.context['object_list']
+    etag = response['ETag']
+    response = admin_client.post(
+        reverse('admin:notes_note_change', args=(note.pk,)),
+        {'title': note.title, 'text': note.text, 'slug': note.slug,
+         'author': not_author.pk},
+    )
+    assert response.status_code == HTTPStatus.FOUND
+    # Прежний автор видит удаление: в журнале, по ETag и в списке.
+    assert NoteChange.objects.filter(
+        author=author, note_id=note.pk, action=NoteChange.DELETE
+    ).exists()
+    assert NoteChange.objects.filter(
+        author=not_author, note_id=note.pk, action=NoteChange.UPSERT
+    ).exists()
+    response = author_client.get(list_url, headers={'If-None-Match': etag})
+    assert response.status_code == HTTPStatus.OK
+    assert note not in response.context['object_list']
+
+
+def test_admin_has_no_delete_selected(admin_client, note):
+    response = admin_client.get(reverse('admin:notes_note_changelist'))
+    choices = dict(response.context['action_form'].fields['action'].choices)
+    assert 'delete_selected' not in choices
+    assert 'delete_by_author' in choices
+
+
+def test_estimated_count_paginator(author, note):
+    Note.objects.create(title='Вторая', text='Текст', author=author)
+    Note.objects.filter(pk=note.pk).delete()
+    paginator = EstimatedCountPaginator(Note.objects.order_by('id'), 10)
+    # Оценка по наибольшему id не замечает удалённую заметку.
+    assert paginator.count == Note.objects.get().pk
+    paginator = EstimatedCountPaginator(
+        Note.objects.filter(author=author).order_by('id'), 10
+    )
+    assert paginator.count == 1
+
+
+def test_delete_author_notes_in_batches(author, not_author, many_notes):
+    other = Note.objects.create(title='Чужая', text='Текст', author=not_author)
+    progress = []
+    deleted = delete_author_notes(author.pk, batch_size=12,
+                                  progress=progress.append)
+    assert deleted == len(many_notes)
+    assert progress == [12, 24, 30]
+    assert list(Note.objects.all()) == [other]
+    assert NoteChange.objects.filter(
+        author=author, action=NoteChange.DELETE
+    ).count() == len(many_notes)
+
+
+def test_delete_user_notes_command(author, note, django_user_model):
+    stderr = StringIO()
+    call_command('delete_user_notes', author.username, '--delete-user',
+                 stderr=stderr)
+    assert 'удалено заметок: 1' in stderr.getvalue()
+    assert not django_user_model.objects.filter(pk=author.pk).exists()
+    assert not Note.objects.exists()
+    assert not NoteChange.objects.exists()
+
+
+@pytest.fixture
+def write_behind(settings):
+    settings.NOTES_WRITE_BEHIND = True
+    yield writer
+    writer.stop()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_behind_create_and_edit(write_behind, author_client, author,
+                                      form_data):
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertRedirects(response, reverse('notes:success'))
+    # Редирект приходит после COMMIT: заметка уже видна.
+    note = Note.objects.get()
+    assert note.author == author
+    form_data['text'] = 'Правка через писателя'
+    response = author_client.post(
+        reverse('notes:edit', args=(note.slug,)), data=form_data
+    )
+    assertRedirects(response, reverse('notes:success'))
+    note.refresh_from_db()
+    assert note.text == form_data['text']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_write_behind_batch_isolates_failures(write_behind, author):
+    def create(slug):
+        return Note.objects.create(
+            title=slug, text='Текст', slug=slug, author=author
+        )
+
+    futures = [
+        write_behind.submit(create, slug)
+        for slug in ('first', 'first', 'second')
+    ]
+    assert futures[0].result(timeout=10).slug == 'first'
+    with pytest.raises(IntegrityError):
+        futures[1].result(timeout=10)
+    assert futures[2].result(timeout=10).slug == 'second'
+    assert sorted(Note.objects.values_list('slug', flat=True)) == [
+        'first', 'second'
+    ]
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('target', ('router', 'close_old_connections'))
+def test_write_behind_survives_batch_failure(write_behind, author,
+                                             monkeypatch, target):
+    calls = []
+
+    def fail_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError('Сбой пачки')
+        return original(*args, **kwargs)
+
+    if target == 'router':
+        # Сбой до транзакции: пачка проваливается целиком.
+        original = notes.writer.router.db_for_write
+        monkeypatch.setattr(notes.writer.router, 'db_for_write', fail_once)
+    else:
+        # Сбой после COMMIT: пачка уже сохранена.
+        original = notes.writer.close_old_connections
+        monkeypatch.setattr(notes.writer, 'close_old_connections', fail_once)
+
+    def create(slug):
+        return Note.objects.create(
+            title=slug, text='Текст', slug=slug, author=author
+        )
+
+    future = write_behind.submit(create, 'first')
+    if target == 'router':
+        with pytest.raises(RuntimeError):
+            future.result(timeout=10)
+    else:
+        assert future.result(timeout=10).slug == 'first'
+    assert write_behind.submit(create, 'second').result(timeout=10)
+    assert Note.objects.filter(slug='second').exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('async_views', (False, True))
+@pytest.mark.parametrize('started', (False, True))
+def test_write_behind_timeout(write_behind, author_client, form_data,
+                              settings, monkeypatch, request, started,
+                              async_views):
+    if async_views:
+        request.getfixturevalue('async_note_views')
+    settings.NOTES_WRITE_BEHIND_TIMEOUT = 0.2
+    release = threading.Event()
+    if started:
+        # Писатель уже взял форму, но COMMIT задерживается.
+        save = Note.save
+        monkeypatch.setattr(
+            Note, 'save',
+            lambda note, *args, **kwargs: (
+                release.wait() and save(note, *args, **kwargs)
+            ),
+        )
+    else:
+        # Писатель занят другим заданием, форма ждёт в очереди.
+        write_behind.submit(release.wait)
+    try:
+        response = author_client.post(reverse('notes:add'), data=form_data)
+    finally:
+        release.set()
+    assertFormError(
+        response.context['form'], None,
+        errors=SAVE_PENDING if started else SAVE_CANCELLED,
+    )
+    write_behind.stop()
+    assert Note.objects.exists() is started
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.usefixtures('async_note_views')
+def test_write_behind_async_views(write_behind, author_client, note,
+                                  form_data):
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertRedirects(response, reverse('notes:success'))
+    assert Note.objects.filter(slug=form_data['slug']).exists()
+    form_data['slug'] = note.slug
+    response = author_client.post(reverse('notes:add'), data=form_data)
+    assertFormError(
+        response.context['form'], 'slug', errors=(note.slug + WARNING)
+    )
+
+
+def test_revisions_store_deltas_between_snapshots(note, settings):
+    settings.NOTES_REVISION_SNAPSHOT_EVERY = 3
+    texts = [note.text]
+    for number in range(6):
+        note.text = f'{note.text}\nСтрока {number}'
+        note.save()
+        texts.append(note.text)
+    # Повторное сохранение без изменений версию не добавляет.
+    note.save()
+    revisions = list(note.revisions.order_by('number'))
+    assert note.revision == len(texts) == len(revisions)
+    assert [revision.is_snapshot for revision in revisions] == [
+        True, False, False, True, False, False, True
+    ]
+    assert [revision.get_text() for revision in revisions] == texts
+
+
+def test_revision_delta_is_small():
+    text = ''.join(f'Строка номер {number}.\n' for number in range(5000))
+    edited = text.replace('Строка номер 2500.', 'Правка.')
+    assert len(encode_delta(text, edited)) < 100
+    assert len(encode_snapshot(edited)) > 10 * len(encode_delta(text, edited))
+
+
+def test_first_edit_of_note_without_revisions(author):
+    Note.objects.bulk_create([
+        Note(title='Старая', text='Было', slug='old', author=author)
+    ])
+    note = Note.objects.get()
+    note.text = 'Стало'
+    note.save()
+    assert [
+        (revision.number, revision.title, revision.get_text())
+        for revision in note.revisions.order_by('number')
+    ] == [(1, 'Старая', 'Было'), (2, 'Старая', 'Стало')]
+
+
+def test_restore_revision(author_client, note, form_data):
+    original_text = note.text
+    author_client.post(reverse('notes:edit', args=(note.slug,)), form_data)
+    note.refresh_from_db()
+    response = author_client.post(
+        reverse('notes:revision', args=(note.slug, 1))
+    )
+    assertRedirects(response, reverse('notes:success'))
+    note.refresh_from_db()
+    assert (note.title, note.text) == ('Заголовок', original_text)
+    # Возврат к версии сам записывается новой версией.
+    assert note.revision == 3
+    response = author_client.get(reverse('notes:revisions', args=(note.slug,)))
+    assert [
+        revision.number for revision in response.context['revisions']
+    ] == [3, 2, 1]
+
+
+def test_restore_stale_revision_is_conflict(author_client, note, form_data):
+    url = reverse('notes:revision', args=(note.slug, 1))
+    seen = author_client.get(url).context['revision'].note.revision
+    # Пока страница версии открыта, заметку правят в другом окне.
+    form_data['slug'] = note.slug
+    author_client.post(reverse('notes:edit', args=(note.slug,)), form_data)
+    response = author_client.post(url, {'revision': seen})
+    assert response.status_code == HTTPStatus.OK
+    assert response.context['error'] == CONFLICT
+    note.refresh_from_db()
+    assert note.text == form_data['text']
+    # Повтор со страницы, показанной с ошибкой, восстанавливает версию.
+    response = author_client.post(
+        url, {'revision': response.context['revision'].note.revision}
+    )
+    assertRedirects(response, reverse('notes:success'))
+
+
+@pytest.mark.parametrize(
+    'error, message',
+    ((RevisionConflict, CONFLICT), (IntegrityError, 'note-slug' + WARNING)),
+)
+def test_restore_revision_save_errors(author_client, note, monkeypatch,
+                                      error, message):
+    def save(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(Note, 'save', save)
+    response = author_client.post(
+        reverse('notes:revision', args=(note.slug, 1))
+    )
+    assert response.status_code == HTTPStatus.OK
+    assert response.context['error'] == message
+
+
+def test_delete_author_notes_deletes_revisions(author, note):
+    delete_author_notes(author.pk)
+    assert not NoteRevision.objects.exists()
+
+
+def test_revision_base_after_refresh_from_db(author):
+    note = Note.objects.create(title='Заметка', text='A\nB\n', author=author)
+    other = Note.objects.get(pk=note.pk)
+    other.text = 'Z\nA\nB\n'
+    other.save()
+    note.refresh_from_db()
+    note.text = 'Z\nA\nB\nC\n'
+    note.save()
+    assert [
+        revision.get_text() for revision in note.revisions.order_by('number')
+    ] == ['A\nB\n', 'Z\nA\nB\n', 'Z\nA\nB\nC\n']
+
+
+def test_concurrent_edits_raise_revision_conflict(note):
+    stale = Note.objects.get(pk=note.pk)
+    note.text = 'Первая правка'
+    note.save()
+    stale.text = 'Вторая правка'
+    with pytest.raises(RevisionConflict):
+        stale.save()
+    note.refresh_from_db()
+    assert note.text == 'Первая правка'
+
+
+def test_revision_conflict_is_form_error(
+        author_client, note, form_data, monkeypatch
+):
+    def conflict(*args, **kwargs):
+        raise RevisionConflict()
+
+    monkeypatch.setattr(Note, 'save', conflict)
+    response = author_client.post(
+        reverse('notes:edit', args=(note.slug,)), data=form_data
+    )
+    assert response.context['form'].non_field_errors() == [CONFLICT]
+    assert not response.context['form'].has_error('slug')
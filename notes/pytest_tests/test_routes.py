@@ -1,8 +1,16 @@
 # test_routes.py
+import importlib.util
+import json
+from functools import partial
 from http import HTTPStatus
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
 from django.urls import reverse
+import notes.urls
 from notes.models import Note
+from notes.querybudget import QUERY_BUDGETS, QueryBudgetExceeded
+import yanote.settings
 from pytest_lazy_fixtures import lf
 from pytest_django.asserts import assertRedirects
 
@@ -27,7 +35,8 @@ def test_pages_availability_for_anonymous_user(client, name):
 # авторизированный клиент
 @pytest.mark.parametrize(
     'name',
-    ('notes:list', 'notes:add', 'notes:success')
+    ('notes:list', 'notes:add', 'notes:success', 'notes:search',
+     'notes:export')
 )
 def test_pages_availability_for_auth_user(not_author_client, name):
     url = reverse(name)
@@ -37,7 +46,7 @@ def test_pages_availability_for_auth_user(not_author_client, name):
 
 @pytest.mark.parametrize(
     'name',
-    ('notes:detail', 'notes:edit', 'notes:delete'),
+    ('notes:detail', 'notes:edit', 'notes:delete', 'notes:revisions'),
 )
 def test_pages_availability_for_author(author_client, name, note):
     url = reverse(name, args=(note.slug,))
@@ -54,7 +63,7 @@ def test_pages_availability_for_author(author_client, name, note):
 ) 
 @pytest.mark.parametrize(
     'name',
-    ('notes:detail', 'notes:edit', 'notes:delete'),
+    ('notes:detail', 'notes:edit', 'notes:delete', 'notes:revisions'),
 )
 def test_pages_availability_for_different_users(
         parametrized_client, name, note, expected_status
@@ -70,9 +79,13 @@ def test_pages_availability_for_different_users(
         ('notes:detail', lf('slug_for_args')),
         ('notes:edit', lf('slug_for_args')),
         ('notes:delete', lf('slug_for_args')),
+        ('notes:revisions', lf('slug_for_args')),
+        ('notes:revision', lf('revision_args')),
         ('notes:add', None),
         ('notes:success', None),
         ('notes:list', None),
+        ('notes:search', None),
+        ('notes:export', None),
     ),
 )
 def test_redirects(client, name, args):
@@ -84,3 +97,186 @@ def test_redirects(client, name, args):
     # Ожидаем, что со всех проверяемых страниц анонимный клиент
     # будет перенаправлен на страницу логина:
     assertRedirects(response, expected_url)
+
+
+@pytest.mark.parametrize(
+    'name, args',
+    (
+        ('notes:api-list', None),
+        ('notes:api-detail', lf('slug_for_args')),
+    ),
+)
+def test_api_requires_login(client, name, args):
+    response = client.get(reverse(name, args=args))
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+
+
+def test_api_note_of_another_user(not_author_client, slug_for_args):
+    response = not_author_client.get(
+        reverse('notes:api-detail', args=slug_for_args)
+    )
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_api_list_cursor(author_client, note):
+    response = author_client.get(reverse('notes:api-list'), {'limit': 1})
+    assert response.status_code == HTTPStatus.OK
+    assert [item['slug'] for item in response.json()['results']] == [
+        note.slug
+    ]
+    assert response.json()['next'] is None
+
+
+@pytest.mark.usefixtures('async_note_views')
+@pytest.mark.parametrize(
+    'parametrized_client, expected_status',
+    [
+        (lf('not_author_client'), HTTPStatus.NOT_FOUND),
+        (lf('author_client'), HTTPStatus.OK)
+    ],
+)
+@pytest.mark.parametrize(
+    'name',
+    ('notes:detail', 'notes:edit', 'notes:delete', 'notes:revisions'),
+)
+def test_async_pages_availability_for_different_users(
+        parametrized_client, name, note, expected_status
+):
+    url = reverse(name, args=(note.slug,))
+    response = parametrized_client.get(url)
+    assert response.status_code == expected_status
+
+
+@pytest.mark.usefixtures('async_note_views')
+@pytest.mark.parametrize(
+    'name, args',
+    (
+        ('notes:detail', lf('slug_for_args')),
+        ('notes:list', None),
+        ('notes:add', None),
+    ),
+)
+def test_async_redirects(client, name, args):
+    url = reverse(name, args=args)
+    response = client.get(url)
+    assertRedirects(response, f'{reverse("users:login")}?next={url}')
+
+
+BATCH = {'operations': [
+    {'op': 'create', 'data': {'title': 'Первая', 'text': 'Текст'}},
+    {'op': 'update', 'slug': 'note-slug', 'data': {'text': 'Правка'}},
+    {'op': 'delete', 'slug': 'note-1'},
+]}
+
+
+@pytest.mark.usefixtures('note', 'many_notes')
+@pytest.mark.parametrize(
+    'name, method, args, data',
+    (
+        ('notes:home', 'get', None, None),
+        ('notes:add', 'get', None, None),
+        ('notes:add', 'post', None, lf('form_data')),
+        ('notes:edit', 'get', lf('slug_for_args'), None),
+        ('notes:edit', 'post', lf('slug_for_args'), lf('form_data')),
+        ('notes:detail', 'get', lf('slug_for_args'), None),
+        ('notes:delete', 'get', lf('slug_for_args'), None),
+        ('notes:delete', 'post', lf('slug_for_args'), None),
+        ('notes:revisions', 'get', lf('slug_for_args'), None),
+        ('notes:revision', 'get', lf('revision_args'), None),
+        ('notes:revision', 'post', lf('revision_args'), None),
+        ('notes:list', 'get', None, None),
+        ('notes:search', 'get', None, {'q': 'Заметка'}),
+        ('notes:export', 'get', None, None),
+        ('notes:success', 'get', None, None),
+        ('notes:api-list', 'get', None, None),
+        ('notes:api-list', 'post', None, lf('form_data')),
+        ('notes:api-detail', 'get', lf('slug_for_args'), None),
+        ('notes:api-detail', 'put', lf('slug_for_args'), lf('form_data')),
+        ('notes:api-detail', 'patch', lf('slug_for_args'), {'text': 'Т'}),
+        ('notes:api-detail', 'delete', lf('slug_for_args'), None),
+        ('notes:api-batch', 'post', None, BATCH),
+        ('notes:api-changes', 'get', None, None),
+        ('notes:metrics', 'get', None, None),
+    ),
+)
+def test_query_budgets(
+        author_client, query_budget, name, method, args, data
+):
+    url = reverse(name, args=args)
+    if 'api-' in name and method != 'get':
+        request = partial(
+            getattr(author_client, method), url,
+            json.dumps(data or {}), content_type='application/json',
+        )
+    else:
+        request = partial(getattr(author_client, method), url, data)
+    with query_budget(name):
+        response = request()
+    assert response.status_code < HTTPStatus.BAD_REQUEST
+
+
+def test_every_route_has_query_budget():
+    names = {f'notes:{pattern.name}' for pattern in notes.urls.urlpatterns}
+    assert names == set(QUERY_BUDGETS)
+
+
+def test_query_budget_middleware(author_client, note, settings):
+    settings.MIDDLEWARE = [
+        'notes.querybudget.QueryBudgetMiddleware', *settings.MIDDLEWARE
+    ]
+    settings.NOTES_USER_CACHE_TIMEOUT = 0
+    QUERY_BUDGETS['notes:detail'], budget = 1, QUERY_BUDGETS['notes:detail']
+    try:
+        with pytest.raises(QueryBudgetExceeded, match='бюджете 1'):
+            author_client.get(reverse('notes:detail', args=(note.slug,)))
+    finally:
+        QUERY_BUDGETS['notes:detail'] = budget
+
+
+@pytest.mark.usefixtures('async_note_views')
+def test_query_budget_middleware_async(async_client, author, note, settings):
+    settings.MIDDLEWARE = [
+        'notes.querybudget.QueryBudgetMiddleware', *settings.MIDDLEWARE
+    ]
+    settings.NOTES_USER_CACHE_TIMEOUT = 0
+    async_client.force_login(author)
+    QUERY_BUDGETS['notes:detail'], budget = 1, QUERY_BUDGETS['notes:detail']
+    try:
+        # Запросы асинхронной view идут в потоке sync_to_async и тоже
+        # попадают в счётчик.
+        with pytest.raises(QueryBudgetExceeded, match='бюджете 1'):
+            async_to_sync(async_client.get)(
+                reverse('notes:detail', args=(note.slug,))
+            )
+    finally:
+        QUERY_BUDGETS['notes:detail'] = budget
+
+
+@pytest.mark.parametrize(
+    'middleware',
+    ('notes.querybudget.QueryBudgetMiddleware',
+     'notes.middleware.MetricsMiddleware',
+     'notes.middleware.ServerTimingMiddleware',
+     'notes.middleware.PrimaryPinningMiddleware'),
+)
+def test_middleware_runs_async_under_asgi(middleware, settings, caplog):
+    settings.MIDDLEWARE = [middleware]
+    # Об адаптации синхронного middleware Django пишет в лог при DEBUG.
+    settings.DEBUG = True
+    with caplog.at_level('DEBUG', logger='django.request'):
+        ASGIHandler()
+    assert 'adapted' not in caplog.text
+
+
+@pytest.mark.parametrize('async_views, whitenoise', (('1', False), ('', True)))
+def test_whitenoise_is_off_in_async_mode(async_views, whitenoise, monkeypatch):
+    monkeypatch.setenv('YANOTE_ASYNC_VIEWS', async_views)
+    # Свежая копия модуля настроек, чтобы не трогать загруженные.
+    spec = importlib.util.spec_from_file_location(
+        'settings_copy', yanote.settings.__file__
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert (
+        'whitenoise.middleware.WhiteNoiseMiddleware' in module.MIDDLEWARE
+    ) is whitenoise
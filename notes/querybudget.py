@@ -0,0 +1,157 @@
+import time
+from contextlib import ContextDecorator, ExitStack
+
+from asgiref.sync import (
+    iscoroutinefunction, markcoroutinefunction, sync_to_async
+)
+
+from django.db import connections
+
+# Максимум SQL-запросов на один запрос к странице, по имени маршрута.
+# Учитываются все запросы, включая чтение сессии и пользователя, для
+# любого метода; запросы, выполняемые при чтении потокового ответа, в бюджет
+# не входят. Сохранение заметки с занятым slug повторяется с суффиксом,
+# поэтому бюджеты записи включают один такой повтор (5 запросов).
+# Новый маршрут в notes.urls должен получить свой бюджет.
+QUERY_BUDGETS = {
+    'notes:home': 2,
+    'notes:add': 11,
+    'notes:edit': 12,
+    'notes:detail': 3,
+    'notes:delete': 8,
+    'notes:revisions': 4,
+    'notes:revision': 9,
+    'notes:list': 4,
+    'notes:search': 3,
+    'notes:export': 2,
+    'notes:success': 2,
+    'notes:api-list': 11,
+    'notes:api-detail': 12,
+    'notes:api-batch': 21,
+    'notes:api-changes': 4,
+    'notes:metrics': 0,
+}
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Страница выполнила больше запросов, чем ей положено."""
+
+
+class QueryCounter:
+    """Записывает SQL всех подключений, выполненный внутри блока.
+
+    Работает через execute_wrapper, поэтому не требует DEBUG. Учитываются
+    только подключения текущего потока. В duration копится суммарное
+    время запросов в секундах.
+
+    В асинхронном коде используется async with: запросы к базе там
+    выполняются в потоке sync_to_async, и обёртки ставятся на его
+    подключения.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.duration = 0.0
+
+    def __len__(self):
+        return len(self.queries)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    async def __aenter__(self):
+        return await sync_to_async(self.__enter__)()
+
+    async def __aexit__(self, *exc_info):
+        await sync_to_async(self.__exit__)(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+
+
+def check_budget(name, queries, budget=None):
+    """Бросает QueryBudgetExceeded, если запросов больше бюджета.
+
+    Без явного budget берётся бюджет маршрута name из QUERY_BUDGETS;
+    маршруты без бюджета не проверяются.
+    """
+    if budget is None:
+        budget = QUERY_BUDGETS.get(name)
+    if budget is None or len(queries) <= budget:
+        return
+    listing = '\n'.join(
+        f'{number}. {sql}' for number, sql in enumerate(queries, 1)
+    )
+    raise QueryBudgetExceeded(
+        f'{name}: {len(queries)} запросов при бюджете {budget}:\n{listing}'
+    )
+
+
+class QueryBudget(ContextDecorator):
+    """Контекстный менеджер и декоратор для тестов.
+
+    QueryBudget('notes:list') проверяет бюджет маршрута,
+    QueryBudget(3) - явное ограничение.
+    """
+
+    def __init__(self, budget):
+        if isinstance(budget, int):
+            self.name, self.budget = f'{budget} запросов', budget
+        else:
+            self.name, self.budget = budget, QUERY_BUDGETS[budget]
+
+    def __enter__(self):
+        self.counter = QueryCounter().__enter__()
+        return self.counter
+
+    def __exit__(self, *exc_info):
+        self.counter.__exit__(*exc_info)
+        if exc_info[0] is None:
+            check_budget(self.name, self.counter.queries, self.budget)
+
+
+class QueryBudgetMiddleware:
+    """Проверяет бюджет запросов каждой страницы при разработке.
+
+    Включается при DEBUG или YANOTE_QUERY_BUDGETS=1 и ставится первым,
+    чтобы учитывать запросы сессии и авторизации. Под ASGI работает
+    асинхронно и не переводит цепочку middleware в поток.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        async with QueryCounter() as counter:
+            response = await self.get_response(request)
+        self.check(request, counter)
+        return response
+
+    @staticmethod
+    def check(request, counter):
+        match = request.resolver_match
+        if match is not None:
+            check_budget(match.view_name, counter.queries)
@@ -0,0 +1,46 @@
+"""Сжатое хранение версий текста заметки.
+
+Версия хранится либо полным снимком текста, либо дельтой относительно
+предыдущей версии. Дельта - список операций над строками прежнего
+текста: пара [начало, конец] копирует строки прежней версии, строка
+добавляет новый текст. Правка нескольких строк большой заметки поэтому
+занимает десятки байт. И снимок, и дельта сжимаются zlib.
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+
+
+def encode_snapshot(text):
+    return zlib.compress(text.encode())
+
+
+def decode_snapshot(data):
+    return zlib.decompress(data).decode()
+
+
+def encode_delta(old, new):
+    """Дельта, превращающая текст old в new."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    operations = []
+    matcher = SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            operations.append([i1, i2])
+        elif j1 < j2:
+            # replace и insert добавляют строки, delete просто пропускается.
+            operations.append(''.join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(operations, ensure_ascii=False).encode())
+
+
+def apply_delta(old, data):
+    """Восстанавливает новый текст по прежнему и дельте encode_delta."""
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for operation in json.loads(zlib.decompress(data)):
+        if isinstance(operation, str):
+            parts.append(operation)
+        else:
+            parts.extend(old_lines[operation[0]:operation[1]])
+    return ''.join(parts)
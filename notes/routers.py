@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# True, когда чтения текущего запроса должны идти в основную базу.
+use_primary = ContextVar('use_primary', default=False)
+
+
+class ReplicaRouter:
+    """Чтение заметок - с реплики, запись - в основную базу.
+
+    Реплика задаётся настройкой NOTES_READ_REPLICA; без неё роутер
+    ничего не меняет. PrimaryPinningMiddleware возвращает чтения на
+    основную базу в изменяющих запросах и сразу после них.
+    """
+    app_label = 'notes'
+
+    def db_for_read(self, model, **hints):
+        replica = settings.NOTES_READ_REPLICA
+        if (replica and model._meta.app_label == self.app_label
+                and not use_primary.get()):
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Иначе объект, прочитанный с реплики, сохранился бы на неё же.
+        if model._meta.app_label == self.app_label:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, settings.NOTES_READ_REPLICA}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == settings.NOTES_READ_REPLICA:
+            return False
+        return None
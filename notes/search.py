@@ -0,0 +1,74 @@
+import re
+from dataclasses import dataclass
+
+from django.db import connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Note
+
+FTS_TABLE = 'notes_note_fts'
+# Заголовок при ранжировании весит больше текста.
+TITLE_WEIGHT = 10.0
+TEXT_WEIGHT = 1.0
+SNIPPET_TOKENS = 16
+# Служебные символы, которыми FTS5 размечает совпадения во фрагменте.
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+_TOKEN_RE = re.compile(r'\w+')
+
+SEARCH_SQL = f'''
+    SELECT note.id, note.slug, note.title,
+           snippet({FTS_TABLE}, 1, %s, %s, '…', %s)
+    FROM {FTS_TABLE}
+    JOIN notes_note AS note ON note.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH %s AND note.author_id = %s
+    ORDER BY bm25({FTS_TABLE}, %s, %s)
+    LIMIT %s OFFSET %s
+'''
+
+
+@dataclass
+class SearchResult:
+    id: int
+    slug: str
+    title: str
+    snippet: str
+
+
+def build_match_query(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки, чтобы операторы FTS5 из ввода не
+    интерпретировались, и ищется по префиксу; слова объединяются по И.
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(query))
+
+
+def highlight(snippet):
+    """Экранирует фрагмент и размечает совпадения тегом <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(HIGHLIGHT_START, '<mark>')
+        .replace(HIGHLIGHT_END, '</mark>')
+    )
+
+
+def search_notes(author, query, offset, limit):
+    """Заметки автора, найденные по запросу, от наиболее релевантных."""
+    match_query = build_match_query(query)
+    if not match_query:
+        return []
+    connection = connections[router.db_for_read(Note)]
+    with connection.cursor() as cursor:
+        cursor.execute(SEARCH_SQL, (
+            HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS,
+            match_query, author.pk,
+            TITLE_WEIGHT, TEXT_WEIGHT,
+            limit, offset,
+        ))
+        return [
+            SearchResult(id, slug, title, highlight(snippet))
+            for id, slug, title, snippet in cursor.fetchall()
+        ]
@@ -0,0 +1,10 @@
+def note_to_dict(note):
+    """Представление заметки для экспорта и JSON API."""
+    return {
+        'id': note.id,
+        'slug': note.slug,
+        'title': note.title,
+        'text': note.text,
+        'created_at': note.created_at.isoformat(),
+        'updated_at': note.updated_at.isoformat(),
+    }
@@ -0,0 +1,99 @@
+"""Удаление больших объёмов заметок без каскада Django.
+
+Каскадное удаление пользователя загружает связанные строки в память
+и держит блокировку SQLite на всё время операции. Здесь заметки
+удаляются пачками: каждая пачка - короткая транзакция с одним
+DELETE ... WHERE author_id = ? AND id IN (...), между пачками другие
+процессы успевают писать.
+"""
+from functools import partial
+
+from django.db import connections, router, transaction
+
+from . import metrics
+from .models import Note, NoteChange, NoteRevision
+
+# Ниже лимита SQLite на число параметров запроса.
+DELETE_BATCH_SIZE = 500
+
+
+def _delete_in_batches(
+    model, author_id, batch_size, using, before_delete=None, progress=None,
+):
+    """Удаляет строки model автора пачками; возвращает их число."""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    rows = model._default_manager.using(using).filter(author_id=author_id)
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using):
+            # Удалённые строки из выборки пропадают, поэтому каждая
+            # следующая пачка - снова первые batch_size id автора.
+            ids = list(
+                rows.order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            if before_delete is not None:
+                before_delete(ids)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE author_id = %s '
+                    f'AND id IN ({", ".join(["%s"] * len(ids))})',
+                    [author_id, *ids],
+                )
+                deleted += cursor.rowcount
+        if progress is not None:
+            progress(deleted)
+
+
+def delete_author_notes(
+    author_id, batch_size=DELETE_BATCH_SIZE, record_changes=True,
+    progress=None,
+):
+    """Удаляет все заметки автора пачками по batch_size.
+
+    При record_changes в журнал изменений пишутся надгробия, чтобы
+    клиенты синхронизации узнали об удалении. progress, если задан,
+    вызывается с числом удалённых заметок после каждой пачки.
+    Возвращает общее число удалённых заметок.
+    """
+    using = router.db_for_write(Note)
+    notes = Note.objects.using(using).filter(author_id=author_id)
+
+    def before_delete(ids):
+        # Сырой DELETE не каскадирует: версии заметок пачки удаляются первыми.
+        NoteRevision.objects.using(using).filter(note_id__in=ids).delete()
+        if record_changes:
+            NoteChange.objects.using(using).record_queryset(
+                notes.filter(id__in=ids), NoteChange.DELETE
+            )
+        transaction.on_commit(
+            partial(
+                metrics.inc, 'notes_note_changes_total', len(ids),
+                action='delete',
+            ),
+            using=using,
+        )
+
+    return _delete_in_batches(
+        Note, author_id, batch_size, using, before_delete, progress
+    )
+
+
+def delete_user(user, batch_size=DELETE_BATCH_SIZE, progress=None):
+    """Удаляет пользователя, предварительно удалив пачками его данные.
+
+    Заметки с их версиями и журнал изменений удаляются без надгробий,
+    после чего каскаду Django при удалении пользователя почти нечего
+    собирать.
+    Возвращает число удалённых заметок.
+    """
+    deleted = delete_author_notes(
+        user.pk, batch_size, record_changes=False, progress=progress
+    )
+    _delete_in_batches(
+        NoteChange, user.pk, batch_size, router.db_for_write(NoteChange)
+    )
+    user.delete()
+    return deleted
@@ -0,0 +1,54 @@
+import re
+from functools import lru_cache
+
+from pytils import translit
+
+SLUG_CACHE_SIZE = 4096
+
+_AMPERSAND_RE = re.compile(r'&amp;|&')
+_SEPARATORS_RE = re.compile(r'[-\s]+')
+_NOT_SLUG_RE = re.compile(r'[^\w\s-]')
+
+
+class _SlugTable(dict):
+    """Таблица для str.translate: символы вне алфавита pytils удаляются."""
+
+    def __missing__(self, key):
+        return None
+
+
+def _build_table():
+    """Собирает таблицу транслитерации из алфавита pytils.
+
+    Для каждого символа алфавита заранее выполняются те же шаги, что
+    pytils.translit.slugify делает со всей строкой после замены
+    пробелов: транслитерация, удаление лишних знаков и нижний регистр.
+    Все замены в pytils односимвольные, поэтому результат посимвольной
+    обработки совпадает с обработкой строки целиком.
+    """
+    table = _SlugTable()
+    for symbol in translit.ALPHABET:
+        if len(symbol) == 1:
+            transliterated = translit.translify(symbol, strict=False)
+            table[ord(symbol)] = _NOT_SLUG_RE.sub('', transliterated).lower()
+    return table
+
+
+_TABLE = _build_table()
+
+
+@lru_cache(maxsize=SLUG_CACHE_SIZE)
+def _slugify_str(text):
+    text = _SEPARATORS_RE.sub('-', _AMPERSAND_RE.sub(' and ', text.lower()))
+    return text.translate(_TABLE)
+
+
+def slugify(text):
+    """Быстрая замена pytils.translit.slugify с тем же результатом.
+
+    Строки обрабатываются одним проходом str.translate, результаты
+    кэшируются; всё остальное передаётся в pytils как есть.
+    """
+    if isinstance(text, str):
+        return _slugify_str(text)
+    return translit.slugify(text)
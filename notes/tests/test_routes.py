@@ -32,7 +32,9 @@ class TestRoutes(TestCase):
                         )
         urls_just_for_authorized = ('notes:add',
                                     'notes:list',
-                                    'notes:success'
+                                    'notes:success',
+                                    'notes:search',
+                                    'notes:export'
                                     )
 
         for user in users:
@@ -56,7 +58,8 @@ class TestRoutes(TestCase):
         )
         for user, status in users_statuses:
             self.client.force_login(user)
-            for name in ('notes:detail', 'notes:edit', 'notes:delete'):
+            for name in ('notes:detail', 'notes:edit', 'notes:delete',
+                         'notes:revisions'):
                 with self.subTest(user=user, name=name):
                     url = reverse(name, args=(self.note.slug,))
                     response = self.client.get(url)
@@ -70,8 +73,10 @@ class TestRoutes(TestCase):
         анонимный пользователь перенаправляется на страницу логина.
         """
         login_url = reverse('users:login')
-        parameterized_urls = ('notes:edit', 'notes:delete', 'notes:detail')
-        not_param_urls = ('notes:add', 'notes:list', 'notes:success')
+        parameterized_urls = ('notes:edit', 'notes:delete', 'notes:detail',
+                              'notes:revisions')
+        not_param_urls = ('notes:add', 'notes:list', 'notes:success',
+                          'notes:search', 'notes:export')
 
         for name in (*parameterized_urls, *not_param_urls):
             arguments = None if name in not_param_urls else (self.note.slug,)
@@ -1,15 +1,42 @@
+from django.conf import settings
 from django.urls import path
 
-from notes import views
+from notes import api, async_views, views
 
 app_name = 'notes'
 
+# Под ASGI страницы заметок можно обслуживать асинхронными вариантами CBV.
+note_views = async_views if settings.NOTES_ASYNC_VIEWS else views
+
 urlpatterns = [
     path('', views.Home.as_view(), name='home'),
-    path('add/', views.NoteCreate.as_view(), name='add'),
-    path('edit/<slug:slug>/', views.NoteUpdate.as_view(), name='edit'),
-    path('note/<slug:slug>/', views.NoteDetail.as_view(), name='detail'),
-    path('delete/<slug:slug>/', views.NoteDelete.as_view(), name='delete'),
-    path('notes/', views.NotesList.as_view(), name='list'),
+    path('add/', note_views.NoteCreate.as_view(), name='add'),
+    path('edit/<slug:slug>/', note_views.NoteUpdate.as_view(), name='edit'),
+    path('note/<slug:slug>/', note_views.NoteDetail.as_view(), name='detail'),
+    path(
+        'delete/<slug:slug>/', note_views.NoteDelete.as_view(), name='delete'
+    ),
+    path(
+        'note/<slug:slug>/revisions/',
+        views.NoteRevisions.as_view(),
+        name='revisions',
+    ),
+    path(
+        'note/<slug:slug>/revisions/<int:number>/',
+        views.NoteRevisionRestore.as_view(),
+        name='revision',
+    ),
+    path('notes/', note_views.NotesList.as_view(), name='list'),
+    path('search/', views.NoteSearch.as_view(), name='search'),
+    path('export/', views.NoteExport.as_view(), name='export'),
     path('done/', views.NoteSuccess.as_view(), name='success'),
+    path('api/notes/', api.NoteListApi.as_view(), name='api-list'),
+    path(
+        'api/notes/<slug:slug>/',
+        api.NoteDetailApi.as_view(),
+        name='api-detail',
+    ),
+    path('api/batch/', api.NoteBatchApi.as_view(), name='api-batch'),
+    path('api/changes/', api.NoteChangesApi.as_view(), name='api-changes'),
+    path('metrics', views.Metrics.as_view(), name='metrics'),
 ]
@@ -1,9 +1,71 @@
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import IntegrityError
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.safestring import mark_safe
 from django.views import generic
+from django.views.decorators.http import condition
 
-from .forms import NoteForm
-from .models import Note
+from . import export, metrics
+from .cache import (
+    get_list_fragment, get_list_version, get_notes_cache, list_fragment_key
+)
+from .forms import (
+    CONFLICT, SAVE_CANCELLED, SAVE_PENDING, WARNING, NoteForm,
+)
+from .middleware import render_timed
+from .models import Note, NoteRevision, RevisionConflict
+from .pagination import paginate_by_cursor
+from .search import search_notes
+from .writer import SaveTimeout, save_form
+
+
+def get_author_list_version(request):
+    """Версия списка заметок автора, читаемая один раз за запрос.
+
+    Её используют и условный GET, и ключ кэша страницы списка.
+    """
+    if not hasattr(request, '_list_version'):
+        request._list_version = get_list_version(request.user.pk)
+    return request._list_version
+
+
+def notes_list_etag(request, *args, **kwargs):
+    """Значение ETag списка: автор и версия его списка.
+
+    Версия - номер в общем журнале изменений и у авторов без записей в
+    журнале равна 0, поэтому без id автора их ETag совпадали бы.
+    """
+    return f'{request.user.pk}-{get_author_list_version(request)}'
+
+
+def get_author_note(request, slug):
+    """Заметка автора, загружаемая один раз за запрос; None, если её нет.
+
+    Её используют и условный GET, и сама страница заметки.
+    """
+    if not hasattr(request, '_author_note'):
+        request._author_note = Note.objects.filter(
+            author=request.user, slug=slug
+        ).first()
+    return request._author_note
+
+
+def note_updated_at(request, slug):
+    note = get_author_note(request, slug)
+    return note.updated_at if note else None
+
+
+def note_etag(request, slug):
+    updated_at = note_updated_at(request, slug)
+    return str(updated_at.timestamp()) if updated_at else None
 
 
 class Home(generic.TemplateView):
@@ -26,22 +88,42 @@ class NoteBase(LoginRequiredMixin):
         return self.model.objects.filter(author=self.request.user)
 
 
-class NoteCreate(NoteBase, generic.CreateView):
-    """Добавление заметки."""
+class NoteFormMixin(NoteBase):
+    """Общая логика форм создания и редактирования заметки."""
     template_name = 'notes/form.html'
     form_class = NoteForm
 
     def form_valid(self, form):
-        new_note = form.save(commit=False)
-        new_note.author = self.request.user
-        new_note.save()
+        try:
+            if settings.NOTES_WRITE_BEHIND:
+                # Сохранение выполнит поток-писатель, редирект - после COMMIT.
+                self.object = save_form(form)
+                return HttpResponseRedirect(self.get_success_url())
+            return super().form_valid(form)
+        except RevisionConflict:
+            form.add_error(None, CONFLICT)
+            return self.form_invalid(form)
+        except SaveTimeout as error:
+            form.add_error(
+                None, SAVE_PENDING if error.started else SAVE_CANCELLED
+            )
+            return self.form_invalid(form)
+        except IntegrityError:
+            # Slug - единственное уникальное поле заметки.
+            form.add_error('slug', form.instance.slug + WARNING)
+            return self.form_invalid(form)
+
+
+class NoteCreate(NoteFormMixin, generic.CreateView):
+    """Добавление заметки."""
+
+    def form_valid(self, form):
+        form.instance.author = self.request.user
         return super().form_valid(form)
 
 
-class NoteUpdate(NoteBase, generic.UpdateView):
+class NoteUpdate(NoteFormMixin, generic.UpdateView):
     """Редактирование заметки."""
-    template_name = 'notes/form.html'
-    form_class = NoteForm
 
 
 class NoteDelete(NoteBase, generic.DeleteView):
@@ -49,11 +131,207 @@ class NoteDelete(NoteBase, generic.DeleteView):
     template_name = 'notes/delete.html'
 
 
+@method_decorator(condition(etag_func=notes_list_etag), name='get')
 class NotesList(NoteBase, generic.ListView):
     """Список всех заметок пользователя."""
     template_name = 'notes/list.html'
+    fragment_template_name = 'notes/includes/list_items.html'
+    paginate_by = 100
+
+    def get(self, request, *args, **kwargs):
+        """Отдаёт страницу списка из кэша, пока заметки автора не менялись."""
+        self.object_list = self.get_queryset()
+        cache_key = list_fragment_key(
+            request.user.pk, request.GET.get('after'),
+            version=get_author_list_version(request),
+        )
+        fragment = get_list_fragment(cache_key)
+        if fragment is None:
+            context = self.get_context_data()
+            fragment = render_timed(
+                request, self.fragment_template_name, context
+            )
+            get_notes_cache().set(cache_key, fragment)
+        else:
+            # Запрос к базе не выполняется: object_list остаётся ленивым.
+            context = {'object_list': self.object_list}
+        context['notes_fragment'] = mark_safe(fragment)
+        return self.render_to_response(context)
+
+    def get_queryset(self):
+        return super().get_queryset().for_list()
 
+    def paginate_queryset(self, queryset, page_size):
+        """Курсорная пагинация: следующая страница задаётся ?after=."""
+        try:
+            notes, self.next_cursor = paginate_by_cursor(
+                queryset, self.request.GET.get('after'), page_size
+            )
+        except ValueError:
+            raise Http404('Некорректный курсор страницы.')
+        return None, None, notes, self.next_cursor is not None
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+
+@method_decorator(
+    condition(etag_func=note_etag, last_modified_func=note_updated_at),
+    name='get',
+)
 class NoteDetail(NoteBase, generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+    def get_object(self, queryset=None):
+        note = get_author_note(self.request, self.kwargs['slug'])
+        if note is None:
+            raise Http404('Заметка не найдена.')
+        return note
+
+
+class NoteRevisions(NoteBase, generic.TemplateView):
+    """История версий заметки, новые сверху; следующая страница - ?before=."""
+    template_name = 'notes/revisions.html'
+    paginate_by = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        note = get_object_or_404(self.get_queryset(), slug=kwargs['slug'])
+        revisions = note.revisions.defer('data').order_by('-number')
+        before = self.request.GET.get('before')
+        if before:
+            try:
+                revisions = revisions.filter(number__lt=int(before))
+            except ValueError:
+                raise Http404('Некорректный номер версии.')
+        revisions = list(revisions[:self.paginate_by + 1])
+        context.update(
+            note=note,
+            revisions=revisions[:self.paginate_by],
+            next_before=(
+                revisions[self.paginate_by - 1].number
+                if len(revisions) > self.paginate_by else None
+            ),
+        )
+        return context
+
+
+class NoteRevisionRestore(NoteBase, generic.DetailView):
+    """Версия заметки; POST делает её текущей, записывая новую версию."""
+    template_name = 'notes/revision.html'
+    context_object_name = 'revision'
+
+    def get_object(self, queryset=None):
+        return get_object_or_404(
+            NoteRevision.objects.select_related('note').defer('note__text'),
+            note__author=self.request.user,
+            note__slug=self.kwargs['slug'],
+            number=self.kwargs['number'],
+        )
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(text=self.object.get_text(), **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        """Восстанавливает версию, если заметку не изменили после GET.
+
+        Форма передаёт номер текущей версии, который видел пользователь;
+        при расхождении, как и при одновременной правке, страница
+        показывается снова с ошибкой.
+        """
+        self.object = revision = self.get_object()
+        note = revision.note
+        seen = request.POST.get('revision')
+        if seen is not None and seen != str(note.revision):
+            return self.render_error(CONFLICT)
+        note.title, note.text = revision.title, revision.get_text()
+        try:
+            note.save()
+        except RevisionConflict:
+            return self.render_error(CONFLICT)
+        except IntegrityError:
+            return self.render_error(note.slug + WARNING)
+        return HttpResponseRedirect(self.get_success_url())
+
+    def render_error(self, error):
+        self.object.note.refresh_from_db()
+        return self.render_to_response(self.get_context_data(error=error))
+
+    def get_success_url(self):
+        return self.success_url
+
+
+class NoteSearch(NoteBase, generic.TemplateView):
+    """Полнотекстовый поиск по заметкам пользователя."""
+    template_name = 'notes/search.html'
+    paginate_by = 20
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        try:
+            page = int(self.request.GET.get('page', 1))
+        except ValueError:
+            raise Http404('Некорректный номер страницы.')
+        if page < 1:
+            raise Http404('Некорректный номер страницы.')
+        results = search_notes(
+            self.request.user, query,
+            offset=(page - 1) * self.paginate_by,
+            limit=self.paginate_by + 1,
+        )
+        context.update(
+            query=query,
+            results=results[:self.paginate_by],
+            page=page,
+            has_next=len(results) > self.paginate_by,
+        )
+        return context
+
+
+class NoteExport(NoteBase, generic.View):
+    """Выгрузка всех заметок автора: ?format=zip (по умолчанию) или jsonl."""
+    formats = {
+        'zip': (export.markdown_zip, 'application/zip', 'notes.zip'),
+        'jsonl': (
+            export.jsonl_lines,
+            'application/x-ndjson; charset=utf-8',
+            'notes.jsonl',
+        ),
+    }
+    # Уже сжатые форматы: GZipMiddleware пропускает ответы с
+    # Content-Encoding и не тратит процессор на повторное сжатие.
+    compressed_formats = {'zip'}
+
+    def get(self, request):
+        name = request.GET.get('format', 'zip')
+        try:
+            stream, content_type, filename = self.formats[name]
+        except KeyError:
+            raise Http404('Неизвестный формат выгрузки.')
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        if name in self.compressed_formats:
+            headers['Content-Encoding'] = 'identity'
+        return StreamingHttpResponse(
+            stream(self.get_queryset().order_by('id')),
+            content_type=content_type,
+            headers=headers,
+        )
+
+
+class Metrics(generic.View):
+    """Метрики для Prometheus; при NOTES_METRICS_TOKEN - по Bearer-токену."""
+
+    def get(self, request):
+        token = settings.NOTES_METRICS_TOKEN
+        if token and not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        ):
+            return HttpResponseForbidden()
+        return HttpResponse(
+            metrics.render(),
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
@@ -0,0 +1,167 @@
+"""Отложенная запись заметок одним потоком-писателем.
+
+SQLite пропускает только одного писателя, и при всплеске записей
+запросы ждут блокировку и упираются в busy_timeout. В режиме
+NOTES_WRITE_BEHIND формы отдают сохранение очереди: поток-писатель
+забирает все накопившиеся задания и выполняет их одной транзакцией,
+каждое в своём savepoint. Пока идёт одна транзакция, копится следующая
+пачка, поэтому число COMMIT (и fsync) растёт медленнее числа записей.
+
+Очередь живёт в памяти процесса: у каждого воркера свой писатель, а
+между процессами запись по-прежнему разделяет busy_timeout.
+"""
+import asyncio
+import atexit
+import queue
+import threading
+from concurrent.futures import Future
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router, transaction
+
+from .models import Note
+
+_STOP = object()
+
+
+class SaveTimeout(Exception):
+    """Запись не подтверждена за NOTES_WRITE_BEHIND_TIMEOUT секунд.
+
+    started=False - задание ещё ждало в очереди и снято с неё, заметка
+    не сохранится. started=True - пачка уже выполняется и запись может
+    сохраниться позже.
+    """
+
+    def __init__(self, started):
+        super().__init__(started)
+        self.started = started
+
+
+class WriteBehindQueue:
+    """Очередь заданий записи с единственным потоком-исполнителем.
+
+    Future задания получает результат только после COMMIT его пачки,
+    то есть когда запись уже сохранена. Исключение задания (например,
+    IntegrityError из-за занятого slug) откатывает только его savepoint
+    и передаётся в Future.
+    """
+
+    def __init__(self):
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            # Поток, упавший на непредвиденной ошибке, запускается заново.
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='notes-writer', daemon=True
+                )
+                self._thread.start()
+        self._jobs.put((future, partial(func, *args, **kwargs)))
+        return future
+
+    def stop(self):
+        """Дожидается уже поставленных заданий и останавливает поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._jobs.put(_STOP)
+            thread.join()
+
+    def _run(self):
+        try:
+            while True:
+                batch = [self._jobs.get()]
+                while len(batch) < settings.NOTES_WRITE_BEHIND_MAX_BATCH:
+                    try:
+                        batch.append(self._jobs.get_nowait())
+                    except queue.Empty:
+                        break
+                jobs = [job for job in batch if job is not _STOP]
+                try:
+                    if jobs:
+                        self._commit(jobs)
+                    close_old_connections()
+                except Exception as error:
+                    # Сбой вне заданий проваливает только текущую пачку,
+                    # писатель продолжает работу со следующей.
+                    self._fail(jobs, error)
+                if len(jobs) < len(batch):
+                    return
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _fail(jobs, error):
+        for future, _ in jobs:
+            if future.running() or (
+                not future.done() and future.set_running_or_notify_cancel()
+            ):
+                future.set_exception(error)
+
+    def _commit(self, jobs):
+        using = router.db_for_write(Note)
+        try:
+            with transaction.atomic(using=using):
+                results = [
+                    (future, *self._execute(job, using))
+                    for future, job in jobs
+                    if future.set_running_or_notify_cancel()
+                ]
+        except Exception as error:
+            # COMMIT не удался: ни одна запись пачки не сохранена.
+            self._fail(jobs, error)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    @staticmethod
+    def _execute(job, using):
+        """Выполняет задание в своём savepoint: (результат, исключение)."""
+        try:
+            with transaction.atomic(using=using):
+                return job(), None
+        except Exception as error:
+            return None, error
+
+
+writer = WriteBehindQueue()
+atexit.register(writer.stop)
+
+
+def _timed_out(future):
+    # cancel() снимает задание, только пока писатель его не взял.
+    return SaveTimeout(started=not future.cancel())
+
+
+def save_form(form):
+    """Сохраняет форму через поток-писатель и ждёт COMMIT.
+
+    Если COMMIT не пришёл за NOTES_WRITE_BEHIND_TIMEOUT, бросает
+    SaveTimeout.
+    """
+    future = writer.submit(form.save)
+    try:
+        return future.result(timeout=settings.NOTES_WRITE_BEHIND_TIMEOUT)
+    except TimeoutError:
+        raise _timed_out(future) from None
+
+
+async def asave_form(form):
+    """Асинхронный вариант save_form: ожидание не занимает поток."""
+    future = writer.submit(form.save)
+    try:
+        # shield: по таймауту задание снимает _timed_out, а не wait_for.
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(future)),
+            settings.NOTES_WRITE_BEHIND_TIMEOUT,
+        )
+    except TimeoutError:
+        raise _timed_out(future) from None
@@ -0,0 +1,36 @@
+from functools import lru_cache
+
+from jinja2 import Environment
+
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+URL_PLACEHOLDER = '__slug__'
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+@lru_cache(maxsize=None)
+def url_prefix(name):
+    """Начало адреса маршрута со slug, например '/note/' для notes:detail.
+
+    Адрес строки списка собирается конкатенацией префикса и slug вместо
+    вызова reverse() на каждую заметку. Slug состоит только из символов,
+    допустимых в пути, поэтому экранирование не требуется.
+    """
+    placeholder_url = reverse(name, kwargs={'slug': URL_PLACEHOLDER})
+    return placeholder_url[:placeholder_url.index(URL_PLACEHOLDER)]
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update(
+        localtime=localtime,
+        static=static,
+        url=url,
+        url_prefix=url_prefix,
+    )
+    return env
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from django.urls import reverse_lazy
@@ -22,11 +23,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'notes.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'notes.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -49,6 +53,24 @@ TEMPLATES = [
     },
 ]
 
+# YANOTE_TEMPLATES=jinja2 рендерит страницы заметок шаблонами Jinja2
+# из каталога jinja2/ (нужен пакет jinja2). Шаблоны, которых там нет,
+# например админки и регистрации, по-прежнему рендерит Django.
+JINJA2_TEMPLATES = {
+    'BACKEND': 'django.template.backends.jinja2.Jinja2',
+    'DIRS': [BASE_DIR / 'jinja2'],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        'environment': 'yanote.jinja2.environment',
+        'context_processors': [
+            'django.contrib.auth.context_processors.auth',
+        ],
+    },
+}
+
+if os.getenv('YANOTE_TEMPLATES') == 'jinja2':
+    TEMPLATES.insert(0, JINJA2_TEMPLATES)
+
 WSGI_APPLICATION = 'yanote.wsgi.application'
 
 
@@ -59,6 +81,171 @@ DATABASES = {
     }
 }
 
+# Профиль SQLite для нескольких воркеров: WAL не блокирует чтение на время
+# записи, соединения живут между запросами, а PRAGMA выполняются один раз
+# при открытии соединения. Включается YANOTE_DB_PROFILE=production.
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ, то есть 64 МиБ
+    'busy_timeout': 5000,  # мс
+    'temp_store': 'MEMORY',
+}
+
+if os.getenv('YANOTE_DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ''.join(
+                f'PRAGMA {name}={value};'
+                for name, value in SQLITE_PRODUCTION_PRAGMAS.items()
+            ),
+            # Запись сразу берёт блокировку и ждёт её по busy_timeout,
+            # а не падает при попытке повысить блокировку чтения.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+# Необязательная реплика только для чтения, например копия файла базы,
+# которую обновляет внешний процесс: YANOTE_REPLICA_DB=/path/replica.sqlite3
+# или алиас уже описанной в DATABASES базы в NOTES_READ_REPLICA.
+NOTES_READ_REPLICA = None
+NOTES_REPLICA_STICKY_SECONDS = 5
+
+if os.getenv('YANOTE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('YANOTE_REPLICA_DB'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    NOTES_READ_REPLICA = 'replica'
+    MIDDLEWARE.insert(0, 'notes.middleware.PrimaryPinningMiddleware')
+
+DATABASE_ROUTERS = ['notes.routers.ReplicaRouter']
+
+# История версий заметок (notes/revisions.py): каждая
+# NOTES_REVISION_SNAPSHOT_EVERY-я версия хранится полным снимком, остальные -
+# сжатой дельтой от предыдущей. Больше значение - меньше места, но длиннее
+# цепочка дельт при чтении старой версии.
+NOTES_REVISION_SNAPSHOT_EVERY = 20
+
+# Отложенная запись (notes/writer.py): формы заметок сохраняет один
+# поток-писатель пачками по NOTES_WRITE_BEHIND_MAX_BATCH в одной
+# транзакции. Включается YANOTE_WRITE_BEHIND=1; ответ ждёт COMMIT не
+# дольше NOTES_WRITE_BEHIND_TIMEOUT секунд, после чего форма показывает
+# ошибку, а ещё не начатое задание снимается с очереди.
+NOTES_WRITE_BEHIND = os.getenv('YANOTE_WRITE_BEHIND') == '1'
+NOTES_WRITE_BEHIND_MAX_BATCH = 100
+NOTES_WRITE_BEHIND_TIMEOUT = 10
+
+# Бюджеты SQL-запросов страниц (notes/querybudget.py). При разработке
+# превышение бюджета сразу падает с перечнем выполненных запросов.
+if DEBUG or os.getenv('YANOTE_QUERY_BUDGETS') == '1':
+    MIDDLEWARE.insert(0, 'notes.querybudget.QueryBudgetMiddleware')
+
+# Заголовок Server-Timing и журнал времени запросов: YANOTE_SERVER_TIMING=1.
+# Для выборочного профилирования задайте долю запросов под cProfile;
+# профили запросов дольше NOTES_PROFILE_SLOW_MS попадут в NOTES_PROFILE_DIR.
+NOTES_PROFILE_SAMPLE_RATE = float(os.getenv('YANOTE_PROFILE_SAMPLE_RATE', 0))
+NOTES_PROFILE_SLOW_MS = 500
+NOTES_PROFILE_DIR = BASE_DIR / 'profiles'
+
+if os.getenv('YANOTE_SERVER_TIMING') == '1':
+    MIDDLEWARE.insert(0, 'notes.middleware.ServerTimingMiddleware')
+
+# Метрики /metrics. При нескольких процессах задайте общий каталог
+# YANOTE_METRICS_DIR: процессы сбрасывают в него счётчики не реже раза
+# в NOTES_METRICS_FLUSH_SECONDS. YANOTE_METRICS_TOKEN закрывает страницу
+# Bearer-токеном.
+NOTES_METRICS_DIR = os.getenv('YANOTE_METRICS_DIR')
+NOTES_METRICS_FLUSH_SECONDS = 5
+NOTES_METRICS_TOKEN = os.getenv('YANOTE_METRICS_TOKEN')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'notes.performance': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
+
+# Кэш отрендеренных списков заметок. По умолчанию живёт в памяти процесса;
+# YANOTE_NOTES_CACHE=file включает файловый кэш, общий для всех воркеров.
+# Ключ фрагмента содержит версию списка из базы (notes/cache.py), поэтому
+# после записи в любом процессе старые фрагменты не читаются ни одним
+# воркером. Размер ограничен MAX_ENTRIES: при переполнении locmem
+# вытесняет давно не использованные записи, а файловый кэш - случайную
+# 1/CULL_FREQUENCY часть файлов.
+NOTES_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'notes',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'notes',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+    },
+    'notes': {
+        **NOTES_CACHE_BACKENDS[os.getenv('YANOTE_NOTES_CACHE', 'locmem')],
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+NOTES_CACHE_ALIAS = 'notes'
+
+# True - занятый slug, указанный пользователем, дополняется числовым
+# суффиксом вместо ошибки формы. Сгенерированный slug дополняется всегда.
+NOTES_SLUG_AUTO_SUFFIX = False
+
+# True - страницы заметок обслуживаются асинхронными CBV из
+# notes.async_views; имеет смысл только при запуске через yanote.asgi.
+NOTES_ASYNC_VIEWS = os.getenv('YANOTE_ASYNC_VIEWS') == '1'
+# WhiteNoise умеет работать только синхронно: под ASGI каждый запрос
+# перешёл бы через него в поток и обратно. В асинхронном режиме статику
+# из STATIC_ROOT (после collectstatic) отдаёт фронтовый сервер.
+if NOTES_ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
+# Максимум операций в одном запросе к пакетному JSON API.
+NOTES_API_BATCH_LIMIT = 100
+
+# Хранилище сессий выбирается YANOTE_SESSIONS:
+# db - таблица django_session (по умолчанию);
+# signed_cookies - подписанные cookie, без запросов к базе;
+# cached_db - база с кэшем сессий в памяти процесса.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+}
+SESSION_ENGINE = SESSION_ENGINES[os.getenv('YANOTE_SESSIONS', 'db')]
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Кэш пользователей сессий в памяти процесса: время жизни записи
+# в секундах (0 отключает кэш) и максимальное число записей. Смена пароля
+# или is_active меняет версию пользователя в кэше default и сразу выбивает
+# его из кэша; пока default - locmem, другие процессы замечают это не
+# позже чем через NOTES_USER_CACHE_TIMEOUT секунд.
+NOTES_USER_CACHE_TIMEOUT = 60
+NOTES_USER_CACHE_SIZE = 1024
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -82,6 +269,20 @@ USE_TZ = True
 
 
 STATIC_URL = '/static/'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+# Собранная статика: python manage.py collectstatic. WhiteNoise отдаёт её
+# прямо из middleware, до маршрутизации, с заранее сжатыми копиями;
+# файлы с хэшем в имени получают Cache-Control на год и immutable.
+# При NOTES_ASYNC_VIEWS middleware WhiteNoise отключён, см. выше.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'yanote.storage.StaticFilesStorage',
+    },
+}
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
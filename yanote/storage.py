@@ -0,0 +1,18 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Статика с хэшем содержимого в имени файла и сжатыми копиями.
+
+    collectstatic кладёт в STATIC_ROOT файлы вида bootstrap.3f2a....css,
+    их gzip-версии и манифест. Пока collectstatic не запускался (разработка,
+    тесты), ссылки ведут на исходные имена файлов.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет в STATIC_ROOT: статика ещё не собрана.
+            return name